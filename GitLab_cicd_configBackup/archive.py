@@ -0,0 +1,292 @@
+#!/usr/bin/env python3
+
+"""
+Compressed, content-addressed archive of backed up configs.
+
+Every config is stored once as a compressed blob named after the sha256
+digest of its plain JSON text, so identical configs of different nodes
+or of different runs share one blob. A small index per host records
+which digest was current at which point in time:
+
+    <archive>/objects/<2 hex digits>/<remaining digest>.json.gz|.json.zst
+    <archive>/index/<host>.jsonl
+
+The module can be used from the command line to list, export or restore
+any archived version as plain JSON.
+"""
+
+import argparse
+import gzip
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+COMPRESSIONS = {"gzip": ".json.gz", "zstd": ".json.zst"}
+
+# sharded backups append to the index of one host from several threads
+_indexLock = threading.Lock()
+
+
+def _blobPath(archive, digest, compression):
+    filename = digest[2:] + COMPRESSIONS[compression]
+    return Path(archive) / "objects" / digest[:2] / filename
+
+
+def _indexPath(archive, host):
+    return Path(archive) / "index" / (host + ".jsonl")
+
+
+def findBlob(archive, digest):
+    """
+    Locate the blob of a digest regardless of its compression.
+
+    :returns:   path of the blob and its compression, (None, None) if missing
+    :rtype: tuple
+    """
+    for compression in COMPRESSIONS:
+        blobpath = _blobPath(archive, digest, compression)
+        if blobpath.is_file():
+            return blobpath, compression
+    return None, None
+
+
+def _openWriter(f, compression):
+    if compression == "zstd":
+        if zstandard is None:
+            raise RuntimeError(
+                "zstd compression requires the zstandard package")
+        return zstandard.ZstdCompressor().stream_writer(f)
+    return gzip.GzipFile(fileobj=f, mode="wb", mtime=0)
+
+
+def _openReader(f, compression):
+    if compression == "zstd":
+        if zstandard is None:
+            raise RuntimeError(
+                "reading zstd blobs requires the zstandard package")
+        return zstandard.ZstdDecompressor().stream_reader(f)
+    return gzip.GzipFile(fileobj=f, mode="rb")
+
+
+def storeBlob(archive, digest, source, compression="gzip"):
+    """
+    Store a config as compressed blob unless the digest is archived already.
+
+    :parameter digest: sha256 hex digest of the plain config
+    :type digest: str
+    :parameter source: the config text or the path of a file holding it
+    :type source: str or Path
+    :parameter compression: "gzip" or "zstd"
+    :type compression: str
+
+    :returns:   True if a new blob was written
+    :rtype: bool
+    """
+    if findBlob(archive, digest)[0] is not None:
+        return False
+
+    blobpath = _blobPath(archive, digest, compression)
+    blobpath.parent.mkdir(parents=True, exist_ok=True)
+    # unique per writer, the same config may be archived concurrently by
+    # the threads and by the converter processes of a pipelined run
+    fd, tmpname = tempfile.mkstemp(dir=str(blobpath.parent),
+                                   prefix=blobpath.name + ".", suffix=".tmp")
+    tmppath = Path(tmpname)
+
+    try:
+        with os.fdopen(fd, "wb") as f:
+            with _openWriter(f, compression) as writer:
+                if isinstance(source, str):
+                    writer.write(source.encode("utf-8"))
+                else:
+                    with Path(source).open("rb") as src:
+                        for chunk in iter(lambda: src.read(1024 * 1024), b""):
+                            writer.write(chunk)
+        # mkstemp creates the file readable by the owner only
+        os.chmod(tmppath, 0o644)
+        os.replace(tmppath, blobpath)
+    except BaseException:
+        tmppath.unlink(missing_ok=True)
+        raise
+
+    return True
+
+
+def readIndex(archive, host):
+    """
+    All archived versions of a host, oldest first.
+
+    :returns:   index records with timestamp, name and sha256
+    :rtype: list
+    """
+    indexpath = _indexPath(archive, host)
+    if not indexpath.is_file():
+        return []
+    with indexpath.open("r", encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def archiveConfig(archive, host, name, digest, source, compression="gzip"):
+    """
+    Archive a config of a host and record it in the host index.
+
+    Nothing is recorded if the digest equals the latest archived version
+    of the same file, so calling this for unchanged configs is cheap.
+
+    :parameter host: hostname of the node as listed in the inventory
+    :type host: str
+    :parameter name: file name relative to the host directory,
+                     e.g. config.json or config/service.json
+    :type name: str
+    :parameter digest: sha256 hex digest of the plain config
+    :type digest: str
+    :parameter source: the config text or the path of a file holding it
+    :type source: str or Path
+
+    :returns:   True if a new version was recorded
+    :rtype: bool
+    """
+    with _indexLock:
+        for record in reversed(readIndex(archive, host)):
+            if record["name"] == name:
+                if (record["sha256"] == digest
+                        and findBlob(archive, digest)[0] is not None):
+                    return False
+                break
+
+    storeBlob(archive, digest, source, compression)
+
+    with _indexLock:
+        indexpath = _indexPath(archive, host)
+        indexpath.parent.mkdir(parents=True, exist_ok=True)
+        with indexpath.open("a", encoding="utf-8") as f:
+            f.write(json.dumps({"timestamp": int(time.time()), "name": name,
+                                "sha256": digest}) + "\n")
+
+    return True
+
+
+def exportBlob(archive, digest, destination):
+    """
+    Write the plain JSON of an archived digest into a binary file object.
+
+    :raises LookupError: Error if the digest is not archived.
+    """
+    blobpath, compression = findBlob(archive, digest)
+    if blobpath is None:
+        raise LookupError("digest " + digest + " is not archived")
+
+    with blobpath.open("rb") as f:
+        reader = _openReader(f, compression)
+        for chunk in iter(lambda: reader.read(1024 * 1024), b""):
+            destination.write(chunk)
+
+
+def selectVersion(archive, host, name, version=None, digest=None):
+    """
+    Select an archived version of a host.
+
+    :parameter name: archived file, the latest version of it is selected
+                     unless version or digest are given
+    :type name: str
+    :parameter version: version number as shown by the list command
+    :type version: int
+    :parameter digest: (prefix of) the sha256 digest of the version
+    :type digest: str
+
+    :returns:   the index record of the version
+    :rtype: dict
+    :raises LookupError: Error if no such version exists.
+    """
+    records = readIndex(archive, host)
+
+    if version is not None:
+        if 0 <= version < len(records):
+            return records[version]
+        raise LookupError("no version " + str(version) + " archived for "
+                          + host)
+
+    for record in reversed(records):
+        if (record["name"] == name
+                and record["sha256"].startswith(digest or "")):
+            return record
+    raise LookupError("no archived version of " + host + "/" + name)
+
+
+def main():
+    """
+    Command line interface to list, export and restore archived configs.
+    """
+    parser = argparse.ArgumentParser(
+        description="Access the compressed config archive.")
+    parser.add_argument("-a", "--archive", default="archive",
+                        help="archive directory (default: %(default)s)")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    listParser = subparsers.add_parser(
+        "list", help="list archived versions of a host")
+    listParser.add_argument("host")
+
+    for command, helpText in (
+        ("export", "write a version as plain JSON to stdout or a file"),
+        ("restore", "write a version back to <host>/<name>"),
+    ):
+        commandParser = subparsers.add_parser(command, help=helpText)
+        commandParser.add_argument("host")
+        commandParser.add_argument("-n", "--name", default="config.json",
+                                   help="archived file of the host"
+                                   " (default: %(default)s)")
+        commandParser.add_argument("-v", "--version", type=int,
+                                   help="version number as shown by list")
+        commandParser.add_argument("-d", "--digest",
+                                   help="sha256 (prefix) of the version")
+        if command == "export":
+            commandParser.add_argument("-o", "--output",
+                                       help="output file (default: stdout)")
+
+    args = parser.parse_args()
+
+    if args.command == "list":
+        for number, record in enumerate(readIndex(args.archive, args.host)):
+            print("{:>4}  {}  {:<30}  {}".format(
+                number, time.strftime("%Y-%m-%d %H:%M:%S",
+                                      time.localtime(record["timestamp"])),
+                record["name"], record["sha256"]))
+        return
+
+    try:
+        record = selectVersion(args.archive, args.host, args.name,
+                               args.version, args.digest)
+    except LookupError as error:
+        print(error, file=sys.stderr)
+        sys.exit(1)
+
+    if args.command == "export" and not args.output:
+        exportBlob(args.archive, record["sha256"], sys.stdout.buffer)
+        return
+
+    if args.command == "export":
+        output = Path(args.output)
+    else:
+        output = Path(args.host) / record["name"]
+    output.parent.mkdir(parents=True, exist_ok=True)
+    with output.open("wb") as f:
+        exportBlob(args.archive, record["sha256"], f)
+    if args.command == "restore":
+        # keep the digest sidecar used by backup.py in sync
+        output.with_name(output.name + ".sha256").write_text(
+            record["sha256"] + "\n", encoding="utf-8")
+    print("Wrote " + record["sha256"] + " to " + str(output))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,10 +1,37 @@
+import argparse
+import hashlib
+import json
+import queue
+import random
+import threading
+import time
 import yaml
-import sys
 import os
-from pysros.management import connect
+import sys
+from collections import namedtuple
+from concurrent.futures import (Future, ProcessPoolExecutor,
+                                ThreadPoolExecutor, as_completed)
 from pathlib import Path
+from jsonstream import (jsonDigest, plainJsonDigest, toPlain, writeJson,
+                        writePlainJson)
+from archive import archiveConfig, COMPRESSIONS
+from configdiff import (diffTrees, emptyChanges, listKeys, mergeChanges,
+                        writeReport)
+
+try:
+    from sros_session import ConnectionPool, sros_profile
+except ImportError:
+    sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                    "..", "common"))
+    from sros_session import ConnectionPool, sros_profile
+
+# Sessions are shared by all worker threads, the cap is raised in main()
+# to match the configured parallelism.
+POOL = ConnectionPool(max_sessions=1)
 
-def get_connection(host=None, username=None, password=None, port=830, hostkey_verify=False):
+
+def get_connection(host=None, username=None, password=None, port=830,
+                   hostkey_verify=False, timeout=300):
     """
     Function definition to obtain a Connection object to a specific
     SR OS device and access the model-driven information.
@@ -12,6 +39,11 @@ def get_connection(host=None, username=None, password=None, port=830, hostkey_ve
     This function also checks whether the script is being executed
     locally on a pySROS capable SROS device or on a remote machine.
 
+    Connection failures are raised to the caller so that a single
+    unreachable node does not terminate the backup of the others.
+    The session is taken from the shared POOL and has to be handed back
+    with POOL.release().
+
     :parameter host: The hostname or IP address of the SR OS node.
     :type host: str
     :paramater credentials: The username and password to connect
@@ -19,22 +51,88 @@ def get_connection(host=None, username=None, password=None, port=830, hostkey_ve
     :type credentials: dict
     :parameter port: The TCP port for the connection to the SR OS node.
     :type port: int
+    :parameter timeout: Timeout in seconds for the NETCONF session.
+    :type timeout: int
     :returns: Connection object for the SR OS node.
     :rtype: :py:class:`pysros.management.Connection`
+    :raises RuntimeError: Error if the connection could not be established.
     """
     try:
-        connection_object = connect(
+        connection_object = POOL.acquire(
             host=host,
             username=username,
             password=password,
             port=port,
-            hostkey_verify=hostkey_verify
+            hostkey_verify=hostkey_verify,
+            timeout=timeout
         )
     except RuntimeError as error1:
-        print("Failed to connect.  Error:", error1)
-        sys.exit(-1)
+        print("Failed to connect to " + str(host) + ".  Error:", error1)
+        raise
     return connection_object
 
+
+class ConnectionFailed(RuntimeError):
+    """Raised once all connection attempts to a host have failed."""
+
+    def __init__(self, host, attempts, error):
+        super().__init__("giving up on {} after {} attempt(s): {}".format(
+            host, attempts, error))
+        self.attempts = attempts
+
+
+# attempts: maximum number of connection attempts per host
+# backoff:  delay in seconds before the first retry, doubled per retry
+# maxBackoff: upper bound for a single delay
+# budget:   maximum number of seconds spent on retries per host
+RetryPolicy = namedtuple("RetryPolicy",
+                         ["attempts", "backoff", "maxBackoff", "budget"])
+
+DEFAULT_RETRY_POLICY = RetryPolicy(attempts=3, backoff=1.0, maxBackoff=10.0,
+                                   budget=30.0)
+
+
+def connectWithRetry(host, username, password, timeout=300,
+                     policy=DEFAULT_RETRY_POLICY):
+    """
+    Obtain a Connection object retrying failed attempts.
+
+    Retries use exponential backoff with full jitter so that many workers
+    retrying against the same flapping node do not synchronise. Retrying
+    stops once either the number of attempts or the time budget of the
+    policy is exhausted.
+
+    :parameter host: The hostname or IP address of the SR OS node.
+    :type host: str
+    :parameter policy: retry limits applied to this host
+    :type policy: RetryPolicy
+
+    :returns:   The connection object and the number of attempts needed.
+    :rtype: tuple
+    :raises ConnectionFailed: Error if no attempt succeeded.
+    """
+    deadline = time.monotonic() + policy.budget
+    attempt = 0
+
+    while True:
+        attempt += 1
+        try:
+            connection_object = get_connection(host=host, username=username,
+                                               password=password,
+                                               timeout=timeout)
+            return connection_object, attempt
+        except (RuntimeError, OSError) as error:
+            if attempt >= policy.attempts:
+                raise ConnectionFailed(host, attempt, error) from error
+            delay = random.uniform(0, min(policy.maxBackoff,
+                                          policy.backoff * 2 ** (attempt - 1)))
+            if time.monotonic() + delay > deadline:
+                raise ConnectionFailed(host, attempt, error) from error
+            print("["+host+"] Retrying connection in {:.1f}s (attempt {}/{})"
+                  .format(delay, attempt + 1, policy.attempts))
+            time.sleep(delay)
+
+
 def getConfig(connection_object, path):
     """
     Dedicated function to retrieve required config.
@@ -52,6 +150,7 @@ def getConfig(connection_object, path):
 
     return config
 
+
 def ConfigToJson(connection_object, path, config):
     """
     Dedicated function to convert config to json.
@@ -61,59 +160,915 @@ def ConfigToJson(connection_object, path, config):
     :paramater config: config retrieved from node
     :type config: dict
 
-    :returns:   
-    :rtype: 
+    :returns:
+    :rtype:
     """
 
-    jsonConfig = connection_object.convert(path=path, payload=config, source_format="pysros", destination_format="json", pretty_print=True)
+    jsonConfig = connection_object.convert(path=path, payload=config,
+                                           source_format="pysros",
+                                           destination_format="json",
+                                           pretty_print=True)
 
     return jsonConfig
 
+
 def loadInventory(inventoryFile):
     f = open(inventoryFile)
     inv = yaml.safe_load(f)
 
     return inv
 
+
+def configDigest(jsonConfig):
+    """
+    Content hash of a config as it is written to disk.
+
+    :parameter jsonConfig: config in json format
+    :type jsonConfig: str
+
+    :returns:   sha256 hex digest
+    :rtype: str
+    """
+    return hashlib.sha256(jsonConfig.encode("utf-8")).hexdigest()
+
+
+def fileDigest(filepath):
+    """
+    Content hash of a stored config file, read in chunks.
+
+    :parameter filepath: path of the stored config
+    :type filepath: Path
+
+    :returns:   sha256 hex digest
+    :rtype: str
+    """
+    digest = hashlib.sha256()
+    with filepath.open("rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def storedDigest(filepath):
+    """
+    Digest of the currently stored config.
+
+    The sha256 digest of the last written config is kept in a sidecar
+    file next to it (config.json.sha256), so an unchanged config is
+    detected without reading the stored copy. The stored file is only
+    hashed when the sidecar is missing, e.g. on the first run.
+    The sidecar is ignored if the stored config itself is missing.
+
+    :parameter filepath: path of the stored config
+    :type filepath: Path
+
+    :returns:   sha256 hex digest or None if there is no stored config
+    :rtype: str
+    """
+    # a sidecar left behind by a deleted config must not hide its absence
+    if not filepath.is_file():
+        return None
+
+    digestpath = filepath.with_name(filepath.name + ".sha256")
+    if digestpath.is_file():
+        return digestpath.read_text(encoding="utf-8").strip()
+    return fileDigest(filepath)
+
+
+def writeDigest(filepath, digest):
+    digestpath = filepath.with_name(filepath.name + ".sha256")
+    digestpath.write_text(digest + "\n", encoding="utf-8")
+
+
+def updateDigest(filepath, digest):
+    """
+    Write the digest sidecar of an unchanged config if it is missing or
+    stale, so an unchanged run does not touch the file.
+
+    :parameter filepath: path of the stored config
+    :type filepath: Path
+    :parameter digest: sha256 hex digest of the stored config
+    :type digest: str
+    """
+    digestpath = filepath.with_name(filepath.name + ".sha256")
+    try:
+        if digestpath.read_text(encoding="utf-8") == digest + "\n":
+            return
+    except OSError:
+        pass
+    writeDigest(filepath, digest)
+
+
+def archiveData(entry, filepath, digest, source, archive):
+    if archive:
+        name = filepath.relative_to(entry).as_posix()
+        with sros_profile.phase("archive"):
+            archived = archiveConfig(archive[0], entry, name, digest, source,
+                                     archive[1])
+        if archived:
+            print("["+entry+"] Archived " + name + " as " + digest[:12])
+
+
+def storeConfig(entry, filepath, actualJsonConfig, archive=None,
+                beforeReplace=None):
+    """
+    Write the config to disk in case its digest changed.
+
+    :parameter entry: hostname of the node as listed in the inventory
+    :type entry: str
+    :parameter filepath: path of the stored config
+    :type filepath: Path
+    :parameter actualJsonConfig: config fetched from the node
+    :type actualJsonConfig: str
+    :parameter archive: archive directory and compression, None to
+                        disable archiving
+    :type archive: tuple
+    :parameter beforeReplace: called with filepath before a changed
+                              config overwrites the stored one
+    :type beforeReplace: callable
+
+    :returns:   "unchanged", "changed" or "created"
+    :rtype: str
+    """
+    actualDigest = configDigest(actualJsonConfig)
+    archiveData(entry, filepath, actualDigest, actualJsonConfig, archive)
+
+    if storedDigest(filepath) == actualDigest:
+        print("["+entry+"] Existing stored config is identical to the"
+              " running config on the node")
+        updateDigest(filepath, actualDigest)
+        return "unchanged"
+
+    if filepath.is_file():
+        status = "changed"
+        if beforeReplace:
+            beforeReplace(filepath)
+    else:
+        print("["+entry+"] File not exist")
+        status = "created"
+
+    with filepath.open("w", encoding="utf-8", newline="") as f:
+        f.write(actualJsonConfig)
+    writeDigest(filepath, actualDigest)
+
+    return status
+
+
+def storeConfigStream(entry, filepath, actualConfig, archive=None,
+                      beforeReplace=None):
+    """
+    Stream the pySROS config to disk in case its digest changed.
+
+    Unlike storeConfig() the JSON text is never held in memory. It is
+    serialized once to compute the digest and, only if that changed, a
+    second time straight into a temporary file that atomically replaces
+    the stored config.
+
+    :parameter entry: hostname of the node as listed in the inventory
+    :type entry: str
+    :parameter filepath: path of the stored config
+    :type filepath: Path
+    :parameter actualConfig: config fetched from the node
+    :type actualConfig: :py:class:`pysros.wrappers.Container`
+    :parameter archive: archive directory and compression, None to
+                        disable archiving
+    :type archive: tuple
+    :parameter beforeReplace: called with filepath before a changed
+                              config overwrites the stored one
+    :type beforeReplace: callable
+
+    :returns:   "unchanged", "changed" or "created"
+    :rtype: str
+    """
+    actualDigest = jsonDigest(actualConfig)
+    return storeStreamed(entry, filepath, actualDigest,
+                         lambda: writeJson(actualConfig, filepath),
+                         archive, beforeReplace)
+
+
+def storePlainConfig(entry, filepath, plain, archive=None):
+    """
+    Write plain JSON data as returned by jsonstream.toPlain() to disk in
+    case its digest changed.
+
+    This is the conversion stage of a pipelined run and is executed in
+    a worker process, hence it only takes picklable arguments.
+
+    :returns:   "unchanged", "changed" or "created"
+    :rtype: str
+    """
+    actualDigest = plainJsonDigest(plain)
+    return storeStreamed(entry, filepath, actualDigest,
+                         lambda: writePlainJson(plain, filepath), archive)
+
+
+def storeStreamed(entry, filepath, actualDigest, write, archive=None,
+                  beforeReplace=None):
+    """
+    Write a config through jsonstream in case its digest changed.
+
+    An unchanged config is neither written nor synced to disk. It is
+    archived from the stored file, which holds the same content.
+
+    :parameter actualDigest: digest of the config fetched from the node
+    :type actualDigest: str
+    :parameter write: writes the config to a temporary file, returns
+                      the file and its digest
+    :type write: callable
+
+    :returns:   "unchanged", "changed" or "created"
+    :rtype: str
+    """
+    if storedDigest(filepath) == actualDigest:
+        archiveData(entry, filepath, actualDigest, filepath, archive)
+        print("["+entry+"] Existing stored config is identical to the"
+              " running config on the node")
+        updateDigest(filepath, actualDigest)
+        return "unchanged"
+
+    tmppath, actualDigest = write()
+    try:
+        archiveData(entry, filepath, actualDigest, tmppath, archive)
+
+        if filepath.is_file():
+            status = "changed"
+            if beforeReplace:
+                beforeReplace(filepath)
+        else:
+            print("["+entry+"] File not exist")
+            status = "created"
+
+        os.replace(tmppath, filepath)
+    except BaseException:
+        tmppath.unlink(missing_ok=True)
+        raise
+    writeDigest(filepath, actualDigest)
+
+    return status
+
+
+class BoundedExecutor:
+    """
+    Executor wrapper limiting the number of submitted, unfinished calls.
+
+    submit() blocks once limit calls are pending, so fetching threads
+    cannot pile up configs in memory while the converter falls behind.
+
+    :parameter executor: executor running the calls
+    :type executor: :py:class:`concurrent.futures.Executor`
+    :parameter limit: maximum number of pending calls
+    :type limit: int
+    """
+
+    def __init__(self, executor, limit):
+        self.executor = executor
+        self._slots = threading.BoundedSemaphore(max(1, limit))
+
+    def submit(self, function, *args, **kwargs):
+        self._slots.acquire()
+        try:
+            future = self.executor.submit(function, *args, **kwargs)
+        except BaseException:
+            self._slots.release()
+            raise
+        future.add_done_callback(lambda _: self._slots.release())
+        return future
+
+    def shutdown(self, wait=True):
+        self.executor.shutdown(wait=wait)
+
+
+# timeout:  NETCONF session timeout in seconds
+# policy:   connection retry limits applied per host
+# stream:   serialize with jsonstream instead of connection_object.convert()
+# shard:    fetch the top-level children of the config path separately
+# shards:   restrict a sharded run to these children (None for all)
+# sessions: number of NETCONF sessions per host used in a sharded run
+# markerPath: state path read to detect config changes, None to always fetch
+# archive:  directory of the compressed config archive, None to disable it
+# compression: compression of archived configs, "gzip" or "zstd"
+# diff:     write a structured change report per host
+# converter: executor running the conversion and disk write stage, None
+#           to convert in the fetching thread
+BackupOptions = namedtuple("BackupOptions", ["timeout", "policy", "stream",
+                                             "shard", "shards", "sessions",
+                                             "markerPath", "archive",
+                                             "compression", "diff",
+                                             "converter"])
+
+DEFAULT_MARKER_PATH = ("/nokia-state:state/system/management-interface"
+                       "/commit-history/commit-id")
+
+DEFAULT_BACKUP_OPTIONS = BackupOptions(timeout=300,
+                                       policy=DEFAULT_RETRY_POLICY,
+                                       stream=False, shard=False, shards=None,
+                                       sessions=1, markerPath=None,
+                                       archive=None, compression="gzip",
+                                       diff=False, converter=None)
+
+
+def getChangeMarker(connection_object, markerPath):
+    """
+    Read a cheap state value that changes with every config commit.
+
+    By default this is the commit history of the node, of which the
+    highest commit-id is used. markerPath may also point to a single
+    leaf, e.g. a last-change timestamp, in which case its value is used.
+
+    :parameter connection_object: The connection object
+    :type connection_object: :py:class:`pysros.management.Connection`
+    :parameter markerPath: state path of the marker
+    :type markerPath: str
+
+    :returns:   The marker as string, None if the node does not provide it.
+    :rtype: str
+    """
+    try:
+        marker = connection_object.running.get(markerPath)
+    except LookupError:
+        return None
+
+    if isinstance(marker, dict):
+        return str(max(marker.keys())) if marker else None
+    return str(getattr(marker, "data", marker))
+
+
+def hasStoredConfig(entry, options):
+    if options.shard:
+        return Path(entry + "/config").is_dir()
+    return Path(entry + "/config.json").is_file()
+
+
+def markerFile(entry, options):
+    """
+    Cache of the change marker, one per storage mode.
+
+    A marker written by a sharded run must not skip a plain run whose
+    config.json is older, and vice versa.
+
+    :returns:   <host>/config.marker, <host>/config.shard.marker in a
+                sharded run
+    :rtype: Path
+    """
+    if options.shard:
+        return Path(entry + "/config.shard.marker")
+    return Path(entry + "/config.marker")
+
+
+# Schema information by path, discovered once per run, see readSchema()
+SCHEMA_CACHE = {}
+SCHEMA_CACHE_LOCK = threading.Lock()
+
+
+def readSchema(connection_object, path):
+    """
+    Names of the direct children of path and key names of the lists
+    below it according to the YANG schema.
+
+    list_paths() is answered from the locally cached YANG modules, so
+    this does not cost any RPC, but it walks every descendant path of
+    the schema. The schema is therefore read from the first node only
+    and reused for all others.
+
+    :parameter connection_object: The connection object
+    :type connection_object: :py:class:`pysros.management.Connection`
+    :parameter path: xpath of the container
+    :type path: str
+
+    :returns:   child names in schema order and the list keys as
+                returned by configdiff.listKeys()
+    :rtype: tuple
+    """
+    with SCHEMA_CACHE_LOCK:
+        schema = SCHEMA_CACHE.get(path)
+        if schema is None:
+            # the path itself is included if it is a list, for its keys
+            paths = [childPath
+                     for childPath in connection_object.list_paths(path)
+                     if childPath.startswith((path + "/", path + "["))]
+            children = []
+            for childPath in paths:
+                if not childPath.startswith(path + "/"):
+                    continue
+                child = childPath[len(path) + 1:].split("/", 1)[0]
+                child = child.split("[", 1)[0]
+                if child and child not in children:
+                    children.append(child)
+            schema = SCHEMA_CACHE[path] = (children, listKeys(paths))
+    return schema
+
+
+def discoverShards(connection_object, path):
+    """
+    Names of the direct children of path according to the YANG schema.
+
+    :parameter connection_object: The connection object
+    :type connection_object: :py:class:`pysros.management.Connection`
+    :parameter path: xpath of the container to be sharded
+    :type path: str
+
+    :returns:   child names in schema order
+    :rtype: list
+    """
+    return list(readSchema(connection_object, path)[0])
+
+
+def diffStored(entry, connection_object, path, filepath, actualConfig):
+    """
+    Structured diff between the stored config file and the fetched one.
+
+    :returns:   changes as returned by configdiff.diffTrees(), None if
+                the stored file could not be parsed
+    :rtype: dict
+    """
+    try:
+        storedConfig = connection_object.convert(
+            path=path, payload=filepath.read_text(encoding="utf-8"),
+            source_format="json", destination_format="pysros")
+    except Exception as error:
+        print("["+entry+"] Skipping diff of " + str(filepath) + ". Error:",
+              error)
+        return None
+    try:
+        keys = readSchema(connection_object, path)[1]
+    except Exception as error:
+        print("["+entry+"] No list keys for the diff of " + str(filepath)
+              + ". Error:", error)
+        keys = None
+    with sros_profile.phase("diff"):
+        return diffTrees(storedConfig, actualConfig, path, keys)
+
+
+def storeData(entry, filepath, connection_object, path, data, options,
+              changes=None):
+    """
+    Convert and store fetched data according to the options.
+
+    :returns:   The status as returned by storeConfig(), or a Future of
+                it if the conversion was handed to options.converter.
+    :rtype: str or :py:class:`concurrent.futures.Future`
+    """
+    archive = None
+    if options.archive:
+        archive = (options.archive, options.compression)
+
+    if options.converter is not None:
+        # only the cheap flattening runs here, encoding, hashing and
+        # writing happen in the converter processes
+        with sros_profile.phase("flatten"):
+            plain = toPlain(data)
+        return options.converter.submit(storePlainConfig, entry, filepath,
+                                        plain, archive)
+
+    beforeReplace = None
+    if changes is not None:
+        def diffBeforeReplace(previouspath):
+            diff = diffStored(entry, connection_object, path, previouspath,
+                              data)
+            if diff:
+                mergeChanges(changes, diff)
+        beforeReplace = diffBeforeReplace
+
+    with sros_profile.phase("store"):
+        if options.stream:
+            return storeConfigStream(entry, filepath, data, archive,
+                                     beforeReplace)
+        jsonConfig = ConfigToJson(connection_object, path, data)
+        return storeConfig(entry, filepath, jsonConfig, archive, beforeReplace)
+
+
+def backupShard(entry, connection_object, path, shard, options, changes=None):
+    """
+    Fetch and store a single subtree into <host>/config/<shard>.json.
+
+    :returns:   "unchanged", "changed", "created" or "absent"
+    :rtype: str
+    """
+    shardPath = path + "/" + shard
+    filepath = Path(entry + "/config/" + shard.replace(":", "_") + ".json")
+
+    try:
+        data = getConfig(connection_object, shardPath)
+    except LookupError:
+        return "absent"
+
+    return storeData(entry, filepath, connection_object, shardPath, data,
+                     options, changes)
+
+
+def backupShards(entry, connection_object, connect_function, path, options,
+                 changes=None):
+    """
+    Backup the children of path as separate requests.
+
+    The subtrees are fetched over a pool of up to options.sessions
+    NETCONF sessions to the same node, connection_object being the
+    first one. A subtree failing (e.g. by running into the session
+    timeout) is recorded and does not affect the other subtrees, its
+    session is replaced by a new one.
+
+    :parameter connect_function: returns an additional connection object
+    :type connect_function: callable
+    :parameter changes: collects the structured diff of all subtrees
+    :type changes: dict
+
+    :returns:   status per subtree
+    :rtype: dict
+    """
+    shards = options.shards or discoverShards(connection_object, path)
+    Path(entry + "/config").mkdir(parents=True, exist_ok=True)
+
+    sessions = queue.Queue()
+    sessions.put(connection_object)
+    opened = [connection_object]
+    lock = threading.Lock()
+
+    def acquire():
+        while True:
+            try:
+                return sessions.get(timeout=0.2)
+            except queue.Empty:
+                pass
+            # all sessions busy, open another one if the pool allows
+            with lock:
+                if len(opened) < options.sessions:
+                    session = connect_function()
+                    opened.append(session)
+                    return session
+
+    def worker(shard):
+        session = None
+        try:
+            session = acquire()
+            status = backupShard(entry, session, path, shard, options, changes)
+        except Exception as error:
+            print("["+entry+"] Backup of " + shard + " failed. Error:", error)
+            # the session state is unknown after a failed request, a
+            # replacement is opened on demand by acquire()
+            if session is not None:
+                with lock:
+                    opened.remove(session)
+                POOL.release(session, discard=True)
+            return "failed"
+        sessions.put(session)
+        return status
+
+    statuses = {}
+    with ThreadPoolExecutor(max_workers=max(1, options.sessions)) as executor:
+        for shard, status in zip(shards, executor.map(worker, shards)):
+            statuses[shard] = status
+
+    # connection_object is released by the caller
+    for session in opened:
+        if session is not connection_object:
+            POOL.release(session)
+
+    return statuses
+
+
+def shardStatus(statuses):
+    values = set(statuses.values())
+    if "failed" in values:
+        return "partial" if values - {"failed", "absent"} else "failed"
+    if values & {"changed", "created"}:
+        return "changed"
+    return "unchanged"
+
+
+def resolveStatus(entry, status):
+    if not isinstance(status, Future):
+        return status
+    try:
+        # the converter processes are not profiled, only the wait for them
+        with sros_profile.phase("converter"):
+            return status.result()
+    except Exception as error:
+        print("["+entry+"] Conversion failed. Error:", error)
+        return "failed"
+
+
+def backupHost(entry, path, username, password,
+               options=DEFAULT_BACKUP_OPTIONS):
+    """
+    Backup the config of a single host.
+
+    Connects to the node, fetches and converts its config and writes
+    it to <host>/config.json in case it differs from the stored one.
+    In an incremental run the fetch is skipped if the change marker of
+    the node equals the one cached in <host>/config.marker
+    (<host>/config.shard.marker in a sharded run).
+    In a sharded run every top-level child is written to its own file
+    <host>/config/<child>.json instead.
+    With options.converter set, the conversion is only submitted and the
+    returned record holds a "finish" callable completing it.
+    Designed to be executed inside a worker thread, all output is
+    prefixed with the hostname.
+
+    :parameter entry: hostname of the node as listed in the inventory
+    :type entry: str
+    :parameter path: xpath pointing towards desired config
+    :type path: str
+    :parameter options: backup settings
+    :type options: BackupOptions
+
+    :returns:   Result record holding host, status, attempts, connection
+                latency and duration.
+    :rtype: dict
+    """
+    start = time.monotonic()
+    result = {"host": entry, "status": "unchanged", "attempts": 0,
+              "latency": None, "error": None}
+
+    def connect_function():
+        return connectWithRetry(entry, username, password, options.timeout,
+                                options.policy)[0]
+
+    try:
+        filepath = Path(entry+'/config.json')
+
+        print("["+entry+"] Establishing Connection")
+        connection_object, result["attempts"] = connectWithRetry(
+            entry, username, password, options.timeout, options.policy)
+        result["latency"] = round(time.monotonic() - start, 3)
+
+        try:
+            marker = None
+            markerpath = markerFile(entry, options)
+            if options.markerPath:
+                marker = getChangeMarker(connection_object, options.markerPath)
+                if (marker is not None and markerpath.is_file()
+                        and hasStoredConfig(entry, options)
+                        and markerpath.read_text(encoding="utf-8").strip()
+                        == marker):
+                    print("["+entry+"] No commit since the last backup,"
+                          " skipping config fetch")
+                    result["status"] = "skipped"
+                    POOL.release(connection_object)
+                    return result
+
+            changes = emptyChanges() if options.diff else None
+
+            print("["+entry+"] Fetching config")
+            if options.shard:
+                statuses = backupShards(entry, connection_object,
+                                        connect_function, path, options,
+                                        changes)
+            else:
+                actualConfig = getConfig(connection_object, path)
+                statuses = {None: storeData(entry, filepath, connection_object,
+                                            path, actualConfig, options,
+                                            changes)}
+        except BaseException:
+            # the session state is unknown after a failed request
+            POOL.release(connection_object, discard=True)
+            raise
+        POOL.release(connection_object)
+
+        def finish():
+            resolved = {name: resolveStatus(entry, status)
+                        for name, status in statuses.items()}
+            if options.shard:
+                result["shards"] = resolved
+                result["status"] = shardStatus(resolved)
+                if result["status"] in ("failed", "partial"):
+                    result["error"] = "failed subtrees: " + ", ".join(
+                        shard for shard, status in resolved.items()
+                        if status == "failed")
+            else:
+                result["status"] = resolved[None]
+                if result["status"] == "failed":
+                    result["error"] = "conversion failed"
+
+            if changes and any(changes.values()):
+                with sros_profile.phase("diff"):
+                    writeReport(Path(entry + "/changes.json"), entry, changes)
+                result["changes"] = {kind: len(paths)
+                                     for kind, paths in changes.items()}
+
+            # the marker is read before the fetch, so a commit in between
+            # is picked up by the next run
+            if (marker is not None and not options.shards
+                    and result["status"] not in ("failed", "partial")):
+                markerpath.write_text(marker + "\n", encoding="utf-8")
+
+            result["duration"] = round(time.monotonic() - start, 3)
+
+        if any(isinstance(status, Future) for status in statuses.values()):
+            # completed by runBackup() once the converter is done
+            result["finish"] = finish
+        else:
+            finish()
+    except Exception as error:
+        if isinstance(error, ConnectionFailed):
+            result["attempts"] = error.attempts
+        print("["+entry+"] Backup failed. Error:", error)
+        result["status"] = "failed"
+        result["error"] = str(error)
+    finally:
+        result["duration"] = round(time.monotonic() - start, 3)
+
+    return result
+
+
+def runBackup(hosts, path, username, password, workers=1,
+              options=DEFAULT_BACKUP_OPTIONS):
+    """
+    Backup all hosts using a bounded pool of worker threads.
+
+    Most of the time per host is spent waiting on NETCONF round-trips,
+    hence a thread pool is sufficient to overlap the hosts. Results are
+    collected as they complete so a slow node does not delay reporting
+    of the others. With options.converter set, conversions handed to it
+    are waited for here while the threads already fetch the next hosts.
+
+    :parameter hosts: hostnames as listed in the inventory
+    :type hosts: list
+    :parameter workers: maximum number of hosts processed in parallel
+    :type workers: int
+    :parameter options: backup settings applied to every host
+    :type options: BackupOptions
+
+    :returns:   Result records in inventory order.
+    :rtype: list
+    """
+    results = {}
+
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as executor:
+        futures = {
+            executor.submit(backupHost, entry, path, username, password,
+                            options): entry
+            for entry in hosts
+        }
+        for future in as_completed(futures):
+            result = future.result()
+            finish = result.pop("finish", None)
+            if finish is not None:
+                try:
+                    finish()
+                except Exception as error:
+                    print("["+result["host"]+"] Backup failed. Error:", error)
+                    result["status"] = "failed"
+                    result["error"] = str(error)
+            results[futures[future]] = result
+
+    return [results[entry] for entry in hosts]
+
+
+def printSummary(results):
+    """
+    Print a per-host summary of a backup run.
+
+    :parameter results: Result records as returned by runBackup()
+    :type results: list
+    """
+    print("\nBackup summary")
+    print("-" * 79)
+    for result in results:
+        line = "{:<40} {:<10} {:>2} {:>8.3f}s".format(
+            result["host"], result["status"], result["attempts"],
+            result["duration"])
+        if result["error"]:
+            line += "  " + result["error"]
+        print(line)
+    print("-" * 79)
+
+
+def writeResults(results, resultFile):
+    """
+    Write the per-host results of a backup run as JSON.
+
+    :parameter results: Result records as returned by runBackup()
+    :type results: list
+    :parameter resultFile: path of the result file
+    :type resultFile: str
+    """
+    with open(resultFile, "w", encoding="utf-8") as f:
+        json.dump({"timestamp": int(time.time()), "hosts": results}, f,
+                  indent=2)
+
+
+def parseArguments():
+    parser = argparse.ArgumentParser(
+        description="Backup the config of all inventory hosts.")
+    parser.add_argument("-i", "--inventory", default="inventory.yaml",
+                        help="inventory file (default: %(default)s)")
+    parser.add_argument("-w", "--workers", type=int,
+                        default=int(os.getenv('BACKUP_WORKERS', '1')),
+                        help="number of hosts backed up in parallel"
+                             " (default: %(default)s, env BACKUP_WORKERS)")
+    parser.add_argument("-t", "--timeout", type=int, default=300,
+                        help="NETCONF session timeout in seconds"
+                             " (default: %(default)s)")
+    parser.add_argument("--retries", type=int,
+                        default=DEFAULT_RETRY_POLICY.attempts,
+                        help="maximum connection attempts per host"
+                             " (default: %(default)s)")
+    parser.add_argument("--backoff", type=float,
+                        default=DEFAULT_RETRY_POLICY.backoff,
+                        help="initial retry delay in seconds"
+                             " (default: %(default)s)")
+    parser.add_argument("--retry-budget", type=float,
+                        default=DEFAULT_RETRY_POLICY.budget,
+                        help="maximum seconds spent retrying per host"
+                             " (default: %(default)s)")
+    parser.add_argument("--stream", action="store_true",
+                        help="stream the config to disk with sorted keys"
+                             " instead of converting it in memory")
+    parser.add_argument("--shard", action="store_true",
+                        help="fetch every top-level subtree separately into"
+                             " <host>/config/<subtree>.json")
+    parser.add_argument("--shards",
+                        type=lambda value: [shard for shard in value.split(",")
+                                            if shard],
+                        help="comma separated subtrees to refetch in a"
+                             " sharded run (default: all)")
+    parser.add_argument("--shard-sessions", type=int, default=1,
+                        help="NETCONF sessions per host used to fetch"
+                             " subtrees in parallel (default: %(default)s)")
+    parser.add_argument("--incremental", action="store_true",
+                        help="skip nodes whose change marker did not change"
+                             " since the last backup")
+    parser.add_argument("--change-marker", default=DEFAULT_MARKER_PATH,
+                        help="state path used as change marker in an"
+                             " incremental run (default: %(default)s)")
+    parser.add_argument("--archive", metavar="DIR",
+                        help="additionally keep every config version in a"
+                             " compressed archive (see archive.py)")
+    parser.add_argument("--archive-compression", choices=sorted(COMPRESSIONS),
+                        default="gzip",
+                        help="compression of archived configs"
+                             " (default: %(default)s)")
+    parser.add_argument("--diff", action="store_true",
+                        help="write the added, removed and modified paths of"
+                             " a changed config to <host>/changes.json")
+    parser.add_argument("--convert-processes", type=int, default=0,
+                        help="convert and write configs in N worker processes"
+                             " while the threads keep fetching (implies"
+                             " --stream output, default: convert in the"
+                             " fetching thread)")
+    parser.add_argument("--results", default="backup_results.json",
+                        help="machine-readable result file"
+                             " (default: %(default)s)")
+    parser.add_argument("--profile", action="store_true",
+                        help="report the time, calls and bytes per phase and"
+                             " path on stderr at exit (env SROS_PROFILE, see"
+                             " sros_profile.py)")
+
+    return parser.parse_args()
+
+
 def main():
     """
 
     """
     path = '/nokia-conf:configure'
 
-    inventory = loadInventory('inventory.yaml')
+    args = parseArguments()
+    sros_profile.enable(args.profile)
+
+    inventory = loadInventory(args.inventory)
 
     NeUsername = os.getenv('NEUSERNAME')
     NePassword = os.getenv('NEPASSWORD')
 
-    for entry in inventory['hosts']:
+    policy = RetryPolicy(attempts=max(1, args.retries), backoff=args.backoff,
+                         maxBackoff=DEFAULT_RETRY_POLICY.maxBackoff,
+                         budget=args.retry_budget)
 
-        filepath = Path(entry+'/config.json')
-      
-        print("Establishing Connection to "+ entry +"\n")
-        connection_object = get_connection(host=entry, username=NeUsername, password=NePassword)
+    markerPath = args.change_marker if args.incremental else None
+    options = BackupOptions(timeout=args.timeout, policy=policy,
+                            stream=args.stream,
+                            shard=args.shard or bool(args.shards),
+                            shards=args.shards,
+                            sessions=max(1, args.shard_sessions),
+                            markerPath=markerPath, archive=args.archive,
+                            compression=args.archive_compression,
+                            diff=args.diff, converter=None)
 
-        print("Fetching config from "+ entry +"\n")
-        actualConfig = getConfig(connection_object, path)
-        actualJsonConfig = ConfigToJson(connection_object, path, actualConfig)
+    POOL.max_sessions = max(1, args.workers) * options.sessions
 
-        if filepath.is_file():
-            print("File exist")
-            with filepath.open("r", encoding ="utf-8") as f:
-                storedConfig = f.read()
-                f.close()
-
-                if storedConfig == actualJsonConfig:
-                    print("Existing stored config is identical to the running config on the nodes")
-                else:
-                    with filepath.open("w", encoding ="utf-8") as f:
-                        f.write(actualJsonConfig)
-                        f.close()
+    converter = None
+    if args.convert_processes > 0:
+        if args.diff:
+            print("--diff needs the fetched tree, converting in the fetching"
+                  " threads")
         else:
-            print("File not exist")
-            with filepath.open("w", encoding ="utf-8") as f:
-                f.write(actualJsonConfig)
-                f.close()
+            # two pending configs per process keep every process busy
+            converter = BoundedExecutor(
+                ProcessPoolExecutor(max_workers=args.convert_processes),
+                2 * args.convert_processes)
+            options = options._replace(stream=True, converter=converter)
+
+    try:
+        results = runBackup(list(inventory['hosts']), path, NeUsername,
+                            NePassword, workers=args.workers, options=options)
+    finally:
+        POOL.close()
+        if converter is not None:
+            converter.shutdown()
+
+    printSummary(results)
+    writeResults(results, args.results)
 
 
 if __name__ == "__main__":
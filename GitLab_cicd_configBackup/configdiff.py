@@ -0,0 +1,180 @@
+"""
+Structured diff of two pySROS config trees.
+
+Both trees are walked once in parallel. Containers are matched by
+member name and YANG list entries by their keys, so the diff runs in
+linear time also for large lists like services or interfaces. Changes
+are reported as xpath-style paths in the same notation getConfig()
+uses, e.g.
+
+    /nokia-conf:configure/service/vprn[service-name="VPRN_1"]/admin-state
+
+An added or removed subtree is reported once by its root path.
+
+The names of the key leaves are taken from the YANG schema, see
+listKeys(). Entries of lists whose keys are unknown are reported with
+positional predicates holding the key values only, e.g. vprn["VPRN_1"].
+"""
+
+import json
+import time
+from pysros.wrappers import Container, Leaf, LeafList
+
+
+def _plain(value):
+    if isinstance(value, (bool, int, str)) or value is None:
+        return value
+    if isinstance(value, list):
+        return [_plain(element) for element in value]
+    # pysros.management.Empty
+    return str(value)
+
+
+def _schemaName(step):
+    # member name without list predicates and module prefix
+    return step.split("[", 1)[0].rsplit(":", 1)[-1]
+
+
+def schemaSteps(path):
+    """
+    Member names along a path, without list predicates and module
+    prefixes.
+
+    :parameter path: xpath, e.g. /nokia-conf:configure/service
+    :type path: str
+
+    :returns:   the names, e.g. ("configure", "service")
+    :rtype: tuple
+    """
+    return tuple(_schemaName(step)
+                 for step in path.strip("/").split("/") if step)
+
+
+def listKeys(paths):
+    """
+    Key leaf names of the YANG lists in schema paths.
+
+    :parameter paths: schema paths as returned by
+                      Connection.list_paths(), where lists carry their
+                      key names, e.g. .../service/vprn[service-name]
+    :type paths: iterable
+
+    :returns:   key names in YANG order by schemaSteps() of the list
+    :rtype: dict
+    """
+    keys = {}
+    for schemaPath in paths:
+        steps = ()
+        for step in schemaPath.strip("/").split("/"):
+            if not step:
+                continue
+            steps += (_schemaName(step),)
+            if "[" in step and steps not in keys:
+                names = step[step.index("[") + 1:-1].split("][")
+                keys[steps] = tuple(name.rsplit(":", 1)[-1] for name in names)
+    return keys
+
+
+def _keyPredicate(key, names):
+    values = key if isinstance(key, tuple) else (key,)
+    if names is None or len(names) != len(values):
+        return "".join("[" + json.dumps(_plain(value)) + "]"
+                       for value in values)
+    return "".join("[" + name + "=" + json.dumps(_plain(value)) + "]"
+                   for name, value in zip(names, values))
+
+
+def _diffNode(old, new, path, changes, steps, keys):
+    if isinstance(old, Container) and isinstance(new, Container):
+        oldMembers, newMembers = old.data, new.data
+        for name in sorted(set(oldMembers) | set(newMembers)):
+            childPath = path + "/" + name
+            if name not in newMembers:
+                changes["removed"].append(childPath)
+            elif name not in oldMembers:
+                changes["added"].append(childPath)
+            else:
+                _diffNode(oldMembers[name], newMembers[name], childPath,
+                          changes, steps + (_schemaName(name),), keys)
+    elif isinstance(old, dict) and isinstance(new, dict):
+        names = keys.get(steps)
+        for key in old.keys() - new.keys():
+            changes["removed"].append(path + _keyPredicate(key, names))
+        for key in new.keys() - old.keys():
+            changes["added"].append(path + _keyPredicate(key, names))
+        for key in old.keys() & new.keys():
+            _diffNode(old[key], new[key], path + _keyPredicate(key, names),
+                      changes, steps, keys)
+    elif (isinstance(old, (Leaf, LeafList))
+          and isinstance(new, (Leaf, LeafList))):
+        if old.data != new.data:
+            changes["modified"].append({"path": path,
+                                        "old": _plain(old.data),
+                                        "new": _plain(new.data)})
+    elif old != new:
+        changes["modified"].append({"path": path,
+                                    "old": _plain(getattr(old, "data", None)),
+                                    "new": _plain(getattr(new, "data", None))})
+
+
+def diffTrees(old, new, path, keys=None):
+    """
+    Compare two pySROS data structures rooted at path.
+
+    :parameter old: previously stored config
+    :type old: :py:class:`pysros.wrappers.Container`
+    :parameter new: config fetched from the node
+    :type new: :py:class:`pysros.wrappers.Container`
+    :parameter path: xpath both structures were retrieved from
+    :type path: str
+    :parameter keys: key names of the lists as returned by listKeys(),
+                     None for positional predicates only
+    :type keys: dict
+
+    :returns:   sorted lists of added, removed and modified paths
+    :rtype: dict
+    """
+    changes = emptyChanges()
+    _diffNode(old, new, path, changes, schemaSteps(path), keys or {})
+    return sortChanges(changes)
+
+
+def emptyChanges():
+    return {"added": [], "removed": [], "modified": []}
+
+
+def sortChanges(changes):
+    changes["added"].sort()
+    changes["removed"].sort()
+    changes["modified"].sort(key=lambda change: change["path"])
+    return changes
+
+
+def mergeChanges(changes, other):
+    for kind in ("added", "removed", "modified"):
+        changes[kind].extend(other[kind])
+    return changes
+
+
+def writeReport(filepath, host, changes):
+    """
+    Write the change report of a backup run.
+
+    :parameter filepath: path of the report
+    :type filepath: Path
+    :parameter host: hostname of the node
+    :type host: str
+    :parameter changes: changes as returned by diffTrees()
+    :type changes: dict
+    """
+    sortChanges(changes)
+    report = {
+        "host": host,
+        "timestamp": int(time.time()),
+        "summary": {kind: len(paths) for kind, paths in changes.items()},
+    }
+    report.update(changes)
+
+    with filepath.open("w", encoding="utf-8") as f:
+        json.dump(report, f, indent=1)
+        f.write("\n")
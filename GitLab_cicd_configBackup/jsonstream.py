@@ -0,0 +1,257 @@
+"""
+Streaming JSON export of pySROS data structures.
+
+The pySROS tree returned by running.get() is serialized branch by
+branch straight into a file instead of building the whole JSON text
+in memory through connection_object.convert(). Members and list
+entries are written in sorted order so that the output is stable
+between runs and diffs stay small.
+
+The output follows RFC 7951: member names carry the YANG module prefix
+whenever the module changes, lists are arrays of entries, 64-bit
+integers are strings and empty leaves are encoded as [null].
+"""
+
+import hashlib
+import itertools
+import json
+import os
+from pysros.wrappers import Container, Leaf, LeafList
+
+# YANG types RFC 7951 encodes as JSON strings although pySROS holds ints
+QUOTED_INT_TYPES = ("int64", "uint64")
+
+
+def _schemaAttribute(node, attribute):
+    # Nodes created locally (without a model) have no schema information
+    try:
+        return str(getattr(node.schema, attribute))
+    except Exception:
+        return None
+
+
+def _sortKey(key):
+    if isinstance(key, tuple):
+        return tuple(_sortKey(element) for element in key)
+    if isinstance(key, bool) or not isinstance(key, int):
+        return (1, str(key))
+    return (0, key)
+
+
+def _memberName(name, node, parentModule):
+    module = _schemaAttribute(node, "module")
+    if module and module != parentModule:
+        return module + ":" + name, module
+    return name, parentModule
+
+
+def _plainValue(value, yangType):
+    if isinstance(value, bool) or value is None or isinstance(value, str):
+        return value
+    if isinstance(value, int):
+        if yangType in QUOTED_INT_TYPES:
+            return str(value)
+        return value
+    # pysros.management.Empty
+    return [None]
+
+
+def _encodeValue(value, yangType, pad, end):
+    value = _plainValue(value, yangType)
+    if isinstance(value, list):
+        return "[" + pad + "null" + end + "]"
+    return json.dumps(value)
+
+
+def _iterValue(node, module, indent, level):
+    pad = "\n" + " " * (indent * (level + 1))
+    end = "\n" + " " * (indent * level)
+
+    if isinstance(node, Leaf):
+        yield _encodeValue(node.data, _schemaAttribute(node, "yang_type"),
+                           pad, end)
+    elif isinstance(node, LeafList):
+        yangType = _schemaAttribute(node, "yang_type")
+        inner = "\n" + " " * (indent * (level + 2))
+        values = [_encodeValue(value, yangType, inner, pad)
+                  for value in node.data]
+        yield ("[" + ",".join(pad + value for value in values)
+               + (end if values else "") + "]")
+    elif isinstance(node, Container):
+        yield from _iterContainer(node.data, module, indent, level)
+    elif isinstance(node, dict):
+        # keyed YANG list: {key: Container}
+        if not node:
+            yield "[]"
+            return
+        yield "["
+        for index, key in enumerate(sorted(node, key=_sortKey)):
+            yield ("," if index else "") + pad
+            yield from _iterContainer(node[key].data, module, indent,
+                                      level + 1)
+        yield end + "]"
+    else:
+        yield json.dumps(node)
+
+
+def _sample(node):
+    # the first entry of a keyed list carries the schema of the list
+    if isinstance(node, dict) and node:
+        return next(iter(node.values()))
+    return node
+
+
+def _iterContainer(members, module, indent, level):
+    if not members:
+        yield "{}"
+        return
+
+    pad = "\n" + " " * (indent * (level + 1))
+    yield "{"
+    for index, name in enumerate(sorted(members)):
+        node = members[name]
+        memberName, memberModule = _memberName(name, _sample(node), module)
+        yield ("," if index else "") + pad + json.dumps(memberName) + ": "
+        yield from _iterValue(node, memberModule, indent, level + 1)
+    yield "\n" + " " * (indent * level) + "}"
+
+
+def _plainNode(node, module):
+    if isinstance(node, Leaf):
+        return _plainValue(node.data, _schemaAttribute(node, "yang_type"))
+    if isinstance(node, LeafList):
+        yangType = _schemaAttribute(node, "yang_type")
+        return [_plainValue(value, yangType) for value in node.data]
+    if isinstance(node, Container):
+        return _plainContainer(node.data, module)
+    if isinstance(node, dict):
+        return [_plainContainer(node[key].data, module)
+                for key in sorted(node, key=_sortKey)]
+    return node
+
+
+def _plainContainer(members, module):
+    plain = {}
+    for name in sorted(members):
+        node = members[name]
+        memberName, memberModule = _memberName(name, _sample(node), module)
+        plain[memberName] = _plainNode(node, memberModule)
+    return plain
+
+
+def toPlain(config):
+    """
+    Convert a pySROS data structure into plain JSON data.
+
+    The result only consists of dicts, lists and scalars in output
+    order, so it can be pickled to another process. Encoding it with
+    writePlainJson() gives the same text as writeJson() on config.
+
+    :parameter config: data returned by running.get()
+    :type config: :py:class:`pysros.wrappers.Container`
+
+    :returns:   JSON data model of config
+    :rtype: dict
+    """
+    return _plainNode(config, None)
+
+
+def iterJson(config, indent=4):
+    """
+    Generate the JSON text of a pySROS data structure in chunks.
+
+    :parameter config: data returned by running.get()
+    :type config: :py:class:`pysros.wrappers.Container`
+    :parameter indent: number of spaces per nesting level
+    :type indent: int
+
+    :returns:   Generator of str chunks forming the JSON document.
+    :rtype: generator
+    """
+    yield from _iterValue(config, None, indent, 0)
+    yield "\n"
+
+
+def jsonDigest(config, indent=4):
+    """
+    Hash the JSON text writeJson() would write, without writing it.
+
+    :parameter config: data returned by running.get()
+    :type config: :py:class:`pysros.wrappers.Container`
+
+    :returns:   sha256 hex digest
+    :rtype: str
+    """
+    return _digestChunks(iterJson(config, indent))
+
+
+def plainJsonDigest(plain, indent=4):
+    """
+    Hash the JSON text writePlainJson() would write, without writing it.
+
+    :returns:   sha256 hex digest
+    :rtype: str
+    """
+    return _digestChunks(_iterPlainJson(plain, indent))
+
+
+def writeJson(config, filepath, indent=4):
+    """
+    Stream a pySROS data structure into a file as JSON.
+
+    The output is written to a temporary file next to filepath and
+    hashed on the fly. The caller atomically renames it onto filepath,
+    so readers never see a partially written config. Use jsonDigest()
+    first to skip the write of an unchanged config.
+
+    :parameter config: data returned by running.get()
+    :type config: :py:class:`pysros.wrappers.Container`
+    :parameter filepath: final destination of the JSON file
+    :type filepath: Path
+
+    :returns:   The temporary file and the sha256 hex digest of its content.
+    :rtype: tuple
+    """
+    return _writeChunks(iterJson(config, indent), filepath)
+
+
+def writePlainJson(plain, filepath, indent=4):
+    """
+    Stream plain JSON data as returned by toPlain() into a file.
+
+    Same contract as writeJson().
+
+    :returns:   The temporary file and the sha256 hex digest of its content.
+    :rtype: tuple
+    """
+    return _writeChunks(_iterPlainJson(plain, indent), filepath)
+
+
+def _iterPlainJson(plain, indent):
+    chunks = json.JSONEncoder(indent=indent).iterencode(plain)
+    return itertools.chain(chunks, ("\n",))
+
+
+def _digestChunks(chunks):
+    digest = hashlib.sha256()
+    for chunk in chunks:
+        digest.update(chunk.encode("utf-8"))
+    return digest.hexdigest()
+
+
+def _writeChunks(chunks, filepath):
+    tmppath = filepath.with_name(filepath.name + ".tmp")
+    digest = hashlib.sha256()
+
+    try:
+        with tmppath.open("w", encoding="utf-8", newline="") as f:
+            for chunk in chunks:
+                digest.update(chunk.encode("utf-8"))
+                f.write(chunk)
+            f.flush()
+            os.fsync(f.fileno())
+    except BaseException:
+        tmppath.unlink(missing_ok=True)
+        raise
+
+    return tmppath, digest.hexdigest()
@@ -0,0 +1,347 @@
+#!/usr/bin/env python3
+
+"""
+Benchmarks of the hot paths of the scripts in this repo.
+
+Every scenario runs against the offline stand-in in common/sros_fake.py
+and is parameterized by scale. Presets select a grid of parameters,
+single parameters can be overridden on the command line:
+
+    python3 benchmarks/run.py --preset small
+    python3 benchmarks/run.py route_resolution --param routes=1000000
+    python3 benchmarks/run.py --compare benchmarks/results/baseline.json
+
+The results are written as JSON to benchmarks/results/ and can be
+compared against an earlier run to spot regressions.
+"""
+
+import argparse
+import contextlib
+import itertools
+import json
+import os
+import platform
+import statistics
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+for folder in ("common", "show_EnhancedRouteTable",
+               "GitLab_cicd_configBackup"):
+    sys.path.insert(0, os.path.join(ROOT, folder))
+
+import sros_fake  # noqa: E402
+
+SCENARIOS = {}
+
+ROUTES_PATH = ("/state/service/vprn[service-name=VPRN_1]"
+               "/route-table/unicast/ipv4/route")
+INTERFACES_PATH = "/state/service/vprn[service-name=VPRN_1]/interface"
+TUNNELS_PATH = "/state/router[router-name=Base]/tunnel-table/ipv4/tunnel"
+LSPS_PATH = "/state/router[router-name=Base]/mpls/lsp"
+
+
+def scenario(name, unit, **presets):
+    """
+    Register a benchmark scenario.
+
+    :parameter unit: what the scenario processes, used for the rate
+    :type unit: str
+    :parameter presets: parameter grid per preset, every parameter maps
+                        to a list of values
+    """
+    def register(function):
+        SCENARIOS[name] = {"function": function, "unit": unit,
+                           "presets": presets}
+        return function
+    return register
+
+
+@contextlib.contextmanager
+def quiet():
+    """Discard everything printed by the benchmarked code."""
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        yield
+
+
+def fake_settings(**params):
+    settings = dict(sros_fake.DEFAULT_SETTINGS)
+    settings.update((name, value) for name, value in params.items()
+                    if name in settings)
+    return settings
+
+
+@scenario("route_resolution", "routes",
+          small={"routes": [10000], "tunnels": [100], "lsps": [100]},
+          medium={"routes": [100000], "tunnels": [100, 2000],
+                  "lsps": [100, 2000]},
+          large={"routes": [1000000], "tunnels": [2000], "lsps": [2000]})
+def route_resolution(routes, tunnels, lsps):
+    """Index building and resolution of all routes of one VPRN."""
+    import show_route_table_enhanced_v3 as route_table
+
+    node = sros_fake.FakeNode.get_instance(
+        fake_settings(routes=routes, tunnels=tunnels, lsps=lsps))
+    service_routes = node.get(None, ROUTES_PATH)
+    interface_list = node.get(None, INTERFACES_PATH)
+    tun_table = node.get(None, TUNNELS_PATH)
+    lsp_list = node.get(None, LSPS_PATH)
+
+    def run():
+        rows = route_table.iter_route_rows(
+            service_routes,
+            route_table.build_interface_index(interface_list),
+            route_table.build_lsp_index(lsp_list),
+            route_table.build_tunnel_index(tun_table),
+        )
+        for _ in rows:
+            pass
+        return routes
+
+    return run
+
+
+@scenario("route_table_main", "routes",
+          small={"routes": [10000], "tunnels": [100], "lsps": [100],
+                 "latency": [0.0]},
+          medium={"routes": [100000], "tunnels": [2000], "lsps": [2000],
+                  "latency": [0.0, 0.05]},
+          large={"routes": [1000000], "tunnels": [2000], "lsps": [2000],
+                 "latency": [0.05]})
+def route_table_main(routes, tunnels, lsps, latency):
+    """show_route_table_enhanced_v3.main() end to end, NDJSON output."""
+    import show_route_table_enhanced_v3 as route_table
+    import sros_session
+
+    spec = "routes={},tunnels={},lsps={},latency={}".format(
+        routes, tunnels, lsps, latency)
+    # generate the data outside of the measurement
+    sros_fake.FakeNode.get_instance(sros_fake.parse_settings(spec)).get(
+        None, ROUTES_PATH)
+
+    def run():
+        pool = sros_session.default_pool()
+        pool.connect_function = sros_fake.connect_function(spec)
+        argv = sys.argv
+        sys.argv = ["show_route_table_enhanced_v3.py", "VPRN_1",
+                    "--format", "ndjson"]
+        try:
+            with quiet():
+                route_table.main()
+        finally:
+            sys.argv = argv
+            sros_session.default_pool().close()
+        return routes
+
+    return run
+
+
+@scenario("backup", "hosts",
+          small={"hosts": [20], "config_services": [100], "latency": [0.0],
+                 "workers": [10]},
+          medium={"hosts": [200], "config_services": [100, 1000],
+                  "latency": [0.0, 0.05], "workers": [50]},
+          large={"hosts": [1000], "config_services": [1000],
+                 "latency": [0.05], "workers": [100]})
+def backup_throughput(hosts, config_services, latency, workers):
+    """backup.runBackup() of all hosts into an empty directory."""
+    import backup
+
+    spec = "config_services={},latency={},connect_latency={}".format(
+        config_services, latency, latency)
+    names = ["bench-" + str(index) for index in range(hosts)]
+    sros_fake.FakeNode.get_instance(sros_fake.parse_settings(spec)).get(
+        None, "/configure")
+
+    def run():
+        cwd = os.getcwd()
+        with tempfile.TemporaryDirectory() as directory:
+            os.chdir(directory)
+            for name in names:
+                os.mkdir(name)
+            backup.POOL.connect_function = sros_fake.connect_function(spec)
+            backup.POOL.max_sessions = workers
+            try:
+                with quiet():
+                    results = backup.runBackup(
+                        names, "/nokia-conf:configure", "admin", "admin",
+                        workers=workers)
+            finally:
+                backup.POOL.close()
+                os.chdir(cwd)
+        failed = [result["host"] for result in results
+                  if result["status"] == "failed"]
+        if failed:
+            raise RuntimeError("backup failed for " + ", ".join(failed))
+        return hosts
+
+    return run
+
+
+@scenario("optical_decoding", "strings",
+          small={"strings": [100000]},
+          medium={"strings": [1000000]},
+          large={"strings": [5000000]})
+def optical_decoding(strings):
+    """Resolution of optical compliance strings one by one."""
+    import optical_compliance
+
+    samples = list(itertools.islice(
+        itertools.cycle(sros_fake.OPTICAL_COMPLIANCE), strings))
+
+    def run():
+        resolve = optical_compliance.resolve_compliance
+        for hex_string in samples:
+            resolve(hex_string)
+        return strings
+
+    return run
+
+
+@scenario("optical_bulk", "strings",
+          small={"strings": [1000000], "distinct": [50]},
+          medium={"strings": [1000000], "distinct": [50, 10000]},
+          large={"strings": [10000000], "distinct": [50, 100000]})
+def optical_bulk(strings, distinct):
+    """Bulk decoding of an inventory dump with repeated strings."""
+    import random
+    import optical_compliance
+
+    generator = random.Random(0)
+    pool = list(sros_fake.OPTICAL_COMPLIANCE)
+    while len(pool) < distinct:
+        descriptors = generator.randint(1, 8) * 4
+        pool.append(":".join("{:02x}".format(generator.randrange(256))
+                             for _ in range(1 + descriptors)))
+    samples = [pool[index % distinct] for index in range(strings)]
+
+    def run():
+        for _ in optical_compliance.decode_many(samples):
+            pass
+        return strings
+
+    return run
+
+
+def parameter_grid(name, preset, overrides):
+    grid = dict(SCENARIOS[name]["presets"][preset])
+    for parameter, value in overrides.items():
+        if parameter in grid:
+            grid[parameter] = [value]
+    names = sorted(grid)
+    for values in itertools.product(*(grid[parameter] for parameter in names)):
+        yield dict(zip(names, values))
+
+
+def measure(name, params, repeat):
+    run = SCENARIOS[name]["function"](**params)
+    times = []
+    items = 0
+    for _ in range(repeat):
+        start = time.perf_counter()
+        items = run()
+        times.append(time.perf_counter() - start)
+    best = min(times)
+    return {
+        "scenario": name,
+        "params": params,
+        "unit": SCENARIOS[name]["unit"],
+        "items": items,
+        "times": [round(value, 6) for value in times],
+        "best": round(best, 6),
+        "mean": round(statistics.mean(times), 6),
+        "rate": round(items / best, 1) if best else None,
+    }
+
+
+def compare(results, baseline):
+    """Print the change of the best time of every result against baseline."""
+    def key(result):
+        return result["scenario"], json.dumps(result["params"], sort_keys=True)
+
+    previous = dict((key(result), result) for result in baseline["results"])
+    for result in results:
+        old = previous.get(key(result))
+        if old is None:
+            continue
+        change = 0.0
+        if old["best"]:
+            change = (result["best"] - old["best"]) / old["best"] * 100
+        print("{:<20} {:<60} {:>9.3f}s -> {:>9.3f}s  {:+7.1f}%".format(
+            result["scenario"], json.dumps(result["params"], sort_keys=True),
+            old["best"], result["best"], change))
+
+
+def parse_value(value):
+    for convert in (int, float):
+        try:
+            return convert(value)
+        except ValueError:
+            pass
+    return value
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Run the benchmarks of this repo.")
+    parser.add_argument("scenarios", nargs="*",
+                        help="scenarios to run: "
+                        + ", ".join(sorted(SCENARIOS)) + " (default: all)")
+    parser.add_argument("--preset", choices=("small", "medium", "large"),
+                        default="small",
+                        help="parameter grid (default: %(default)s)")
+    parser.add_argument("--param", action="append", default=[],
+                        metavar="NAME=VALUE",
+                        help="override a parameter of the grid")
+    parser.add_argument("--repeat", type=int, default=3,
+                        help="runs per parameter set, the best is reported"
+                        " (default: %(default)s)")
+    parser.add_argument("--output",
+                        help="result file"
+                        " (default: benchmarks/results/<timestamp>.json)")
+    parser.add_argument("--compare",
+                        help="earlier result file to compare with")
+    args = parser.parse_args()
+
+    unknown = [name for name in args.scenarios if name not in SCENARIOS]
+    if unknown:
+        parser.error("unknown scenario: " + ", ".join(unknown))
+
+    overrides = {}
+    for item in args.param:
+        name, _, value = item.partition("=")
+        overrides[name] = parse_value(value)
+
+    results = []
+    for name in args.scenarios or sorted(SCENARIOS):
+        for params in parameter_grid(name, args.preset, overrides):
+            result = measure(name, params, max(1, args.repeat))
+            results.append(result)
+            print("{:<20} {:<60} best {:>9.3f}s  {:>12.1f} {}/s".format(
+                name, json.dumps(params, sort_keys=True), result["best"],
+                result["rate"] or 0, result["unit"]))
+
+    report = {
+        "timestamp": int(time.time()),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "preset": args.preset,
+        "results": results,
+    }
+    output = args.output or os.path.join(
+        ROOT, "benchmarks", "results",
+        time.strftime("%Y%m%d-%H%M%S") + ".json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w") as f:
+        json.dump(report, f, indent=1)
+        f.write("\n")
+    print("Results written to " + output)
+
+    if args.compare:
+        with open(args.compare) as f:
+            compare(results, json.load(f))
+
+
+if __name__ == "__main__":
+    main()
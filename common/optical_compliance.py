@@ -0,0 +1,481 @@
+#!/usr/bin/env python3
+
+"""
+Code tables of the optical compliance of CMIS transceivers.
+
+SR OS reports the optical compliance of a port as a hex string, e.g.
+"02:11:04:84:01". The first byte is the module type, followed by 4-byte
+application descriptors:
+
+    byte 0  host electrical interface code
+    byte 1  module media interface code, SMF or MMF table depending on
+            the module type
+    byte 2  host lane count (high nibble) and media lane count (low
+            nibble)
+    byte 3  host lane assignment options
+
+The code tables below are compiled once into dense tuples of 256
+entries indexed by the byte value. Codes without a meaning resolve to
+the text shown for them, so decoding a byte is a plain index without
+any lookup failure or range check.
+
+resolve_compliance() decodes a single string by plain indexing, as used
+on-box. decode_many() resolves inventory dumps of many transceivers. The
+same compliance string is typically reported by thousands of ports, so
+every distinct string is only decoded once, the descriptors are unpacked
+with struct where available.
+
+Copy this file next to OpticalComplianceResolution_v2.py or
+pySROS_OpticalCompliance_v2.py when a script is copied on its own.
+"""
+
+from collections import namedtuple
+
+try:
+    from struct import Struct
+except ImportError:
+    # the SR OS on-box interpreter may come without struct.Struct
+    Struct = None
+
+# Module Type Mapping based on Table 8-12 in
+# QSFP-DD-CMIS-rev4p0.pdf
+MODULE_TYPE_CODES = {
+    0x00: "Unknown",
+    0x01: "Optical Interfaces: MMF",
+    0x02: "Optical Interfaces: SMF",
+    0x03: "Passive Cu",
+    0x04: "Active Cable",
+    0x05: "BASE-T"
+}
+
+HOST_ELECTRICAL_CODES = {
+    0x00: "Undefined",
+    0x01: "1000BASE-CX (Clause 39)",
+    0x02: "XAUI (Clause 47)",
+    0x03: "XFI (SFF INF-8071i)",
+    0x04: "SFI (SFF-8431)",
+    0x05: "25GAUI C2M (Annex 109B)",
+    0x06: "XLAUI C2M (Annex 83B)",
+    0x07: "XLPPI (Annex 86A)",
+    0x08: "LAUI-2 C2M (Annex 135C)",
+    0x09: "50GAUI-2 C2M (Annex 135E)",
+    0x0A: "50GAUI-1 C2M (Annex 135G)",
+    0x0B: "CAUI-4 C2M (Annex 83E)1",
+    0x41: "CAUI-4 C2M (Annex 83E) without FEC",
+    0x42: "CAUI-4 C2M (Annex 83E) with RS(528,514) FEC",
+    0x0C: "100GAUI-4 C2M (Annex 135E)",
+    0x0D: "100GAUI-2 C2M (Annex 135G)",
+    0x4B: "100GAUI-1-S C2M (Annex 120G)",
+    0x4C: "100GAUI-1-L C2M (Annex 120G)",
+    0x0E: "200GAUI-8 C2M (Annex 120C)",
+    0x0F: "200GAUI-4 C2M (Annex 120E)",
+    0x4D: "200GAUI-2-S C2M (Annex 120G)",
+    0x4E: "200GAUI-2-L C2M (Annex 120G)",
+    0x10: "400GAUI-16 C2M (Annex 120C)",
+    0x11: "400GAUI-8 C2M (Annex 120E)",
+    0x4F: "400GAUI-4-S C2M (Annex 120G)",
+    0x50: "400GAUI-4-L C2M (Annex 120G)",
+    0x51: "800G S C2M (placeholder)",
+    0x52: "800G L C2M (placeholder)",
+    0x12: "Reserved",
+    0x13: "10GBASE-CX4 (Clause 54)",
+    0x14: "25GBASE-CR CA-25G-L (Clause 110)",
+    0x15: "25GBASE-CR or 25GBASE-CR-S CA-25G-S (Clause 110)",
+    0x16: "25GBASE-CR or 25GBASE-CR-S CA-25G-N (Clause 110)",
+    0x17: "40GBASE-CR4 (Clause 85)",
+    0x43: "50GBASE-CR2 (Ethernet Technology Consortium) with RS(528,514)"
+          " (Clause 91) FEC",
+    0x44: "50GBASE-CR2 (Ethernet Technology Consortium) with BASE-R"
+          " (Clause 74), Fire code FEC",
+    0x45: "50GBASE-CR2 (Ethernet Technology Consortium) with no FEC",
+    0x18: "50GBASE-CR (Clause 136)",
+    0x19: "100GBASE-CR10 (Clause 85)",
+    0x1A: "100GBASE-CR4 (Clause 92)",
+    0x1B: "100GBASE-CR2 (Clause 136)",
+    0x46: "100GBASE-CR1 (Clause 162)",
+    0x1C: "200GBASE-CR4 (Clause 136)",
+    0x47: "200GBASE-CR2 (Clause 162)",
+    0x1D: "400G CR8 (Ethernet Technology Consortium)",
+    0x48: "400GBASE-CR4 (Clause 162)",
+    0x49: "800G-ETC-CR8",
+    0x25: "8GFC (FC-PI-4)",
+    0x26: "10GFC (10GFC)",
+    0x27: "16GFC (FC-PI-5)",
+    0x28: "32GFC (FC-PI-6)",
+    0x29: "64GFC (FC-PI-7)",
+    0x4A: "128GFC (FC-PI-8)",
+    0x2A: "128GFC (FC-PI-6P)",
+    0x2B: "256GFC (FC-PI-7P)",
+    0x2C: "IB SDR (Arch.Spec.Vol.2)",
+    0x2D: "IB DDR (Arch.Spec.Vol.2)",
+    0x2E: "IB QDR (Arch.Spec.Vol.2)",
+    0x2F: "IB FDR (Arch.Spec.Vol.2)",
+    0x30: "IB EDR (Arch.Spec.Vol.2)",
+    0x31: "IB HDR (Arch.Spec.Vol.2)",
+    0x32: "IB NDR",
+    0x33: "E.96 (CPRI Specification V7.0)",
+    0x34: "E.99 (CPRI Specification V7.0)",
+    0x35: "E.119 (CPRI Specification V7.0)",
+    0x36: "E.238 (CPRI Specification V7.0)",
+    0x37: "OTL3.4 (ITU-T G.709/Y.1331 G.Sup58) See XLAUI (overclocked)",
+    0x38: "OTL4.10 (ITU-T G.709/Y.1331 G.Sup58) See CAUI-10 (overclocked)",
+    0x53: "OTL4.2",
+    0x39: "OTL4.4 (ITU-T G.709/Y.1331 G.Sup58) See CEI-28G-VSR",
+    0x3A: "OTLC.4 (ITU-T G.709.1/Y.1331 G.Sup58) See CEI-28G-VSR",
+    0x3B: "FOIC1.4 (ITU-T G.709.1/Y.1331 G.Sup58) See CEI-28G-VSR",
+    0x3C: "FOIC1.2 (ITU-T G.709.1/Y.1331 G.Sup58) See CEI-56G-VSR-PAM4",
+    0x3D: "FOIC2.8 (ITU-T G.709.1/Y.1331 G.Sup58) See CEI-28G-VSR",
+    0x3E: "FOIC2.4 (ITU-T G.709.1/Y.1331 G.Sup58) See CEI-56G-VSR-PAM4",
+    0x3F: "FOIC4.16 (ITU-T G.709.1 G.Sup58) See CEI-28G-VSR",
+    0x40: "FOIC4.8 (ITU-T G.709.1 G.Sup58) See CEI-56G-VSR-PAM4",
+    0xC0: "Vendor Specific/Custom",
+    0xFF: "End of list"
+}
+
+# Second byte data mapping
+SMF_MEDIA_CODES = {
+    0x01: "10GBASE-LW (Clause 52)",
+    0x02: "10GBASE-EW (Clause 52)",
+    0x03: "10G-ZW",
+    0x04: "10GBASE-LR (Clause 52)",
+    0x05: "10GBASE-ER (Clause 52)",
+    0x4E: "10GBASE-BR (Clause 158)1",
+    0x06: "10G-ZR",
+    0x07: "25GBASE-LR (Clause 114)",
+    0x08: "25GBASE-ER (Clause 114)",
+    0x4F: "25GBASE-BR (Clause 159)1",
+    0x09: "40GBASE-LR4 (Clause 87)",
+    0x0A: "40GBASE-FR (Clause 89)",
+    0x0B: "50GBASE-FR (Clause 139)",
+    0x0C: "50GBASE-LR (Clause 139)",
+    0x40: "50GBASE-ER (Clause 139)",
+    0x50: "50GBASE-BR (Clause 160)1",
+    0x0D: "100GBASE-LR4 (Clause 88)",
+    0x0E: "100GBASE-ER4 (Clause 88)",
+    0x0F: "100G PSM4 MSA Spec",
+    0x34: "100G CWDM4-OCP",
+    0x10: "100G CWDM4 MSA Spec",
+    0x11: "100G 4WDM-10 MSA Spec",
+    0x12: "100G 4WDM-20 MSA Spec",
+    0x13: "100G 4WDM-40 MSA Spec",
+    0x14: "100GBASE-DR (Clause 140)",
+    0x15: "100G-FR MSA spec2/100GBASE-FR1 (Clause 140)",
+    0x16: "100G-LR MSA spec2/100GBASE-LR1 (Clause 140)",
+    0x4A: "100G-LR1-20 MSA Spec2",
+    0x4B: "100G-ER1-30 MSA Spec2",
+    0x4C: "100G-ER1-40 MSA Spec2",
+    0x44: "100GBASE-ZR (Clause 154)",
+    0x17: "200GBASE-DR4 (Clause 121)",
+    0x18: "200GBASE-FR4 (Clause 122)",
+    0x19: "200GBASE-LR4 (Clause 122)",
+    0x41: "200GBASE-ER4 (Clause 122)",
+    0x1A: "400GBASE-FR8 (Clause 122)",
+    0x1B: "400GBASE-LR8 (Clause 122)",
+    0x42: "400GBASE-ER8 (Clause 122)",
+    0x1C: "400GBASE-DR4 (Clause 124)",
+    0x55: "400GBASE-DR4-2 (placeholder)",
+    0x1D: "400G-FR4 MSA spec2/400GBASE-FR4 (Clause 151)",
+    0x43: "400GBASE-LR4-6 (Clause 151)",
+    0x1E: "400G-LR4-10 MSA Spec2",
+    0x4D: "400GBASE-ZR (Clause 156)",
+    0x56: "800GBASE-DR8 (placeholder)",
+    0x57: "800GBASE-DR8-2 (placeholder)",
+    0x1F: "8GFC-SM (FC-PI-4)",
+    0x20: "10GFC-SM (10GFC)",
+    0x21: "16GFC-SM (FC-PI-5)",
+    0x22: "32GFC-SM (FC-PI-6)",
+    0x23: "64GFC-SM (FC-PI-7)",
+    0x45: "128GFC-SM (FC-PI-8)",
+    0x24: "128GFC-PSM4 (FC-PI-6P)",
+    0x26: "128GFC-CWDM4 (FC-PI-6P)",
+    0x2C: "4I1-9D1F (G.959.1)",
+    0x2D: "4L1-9C1F (G.959.1)",
+    0x2E: "4L1-9D1F (G.959.1)",
+    0x2F: "C4S1-9D1F (G.695)",
+    0x30: "C4S1-4D1F (G.695)",
+    0x31: "4I1-4D1F (G.959.1)",
+    0x32: "8R1-4D1F (G.959.1)",
+    0x33: "8I1-4D1F (G.959.1)",
+    0x51: "FOIC1.4-DO (G.709.3/Y.1331.3)3",
+    0x52: "FOIC2.8-DO (G.709.3/Y.1331.3)3",
+    0x53: "FOIC4.8-DO (G.709.3/Y.1331.3)3",
+    0x54: "FOIC2.4-DO (G.709.3/Y.1331.3)3",
+    0x38: "10G-SR",
+    0x39: "10G-LR",
+    0x3A: "25G-SR",
+    0x3B: "25G-LR",
+    0x3C: "10G-LR-BiDi",
+    0x3D: "25G-LR-BiDi",
+    0x3E: "400ZR, DWDM, amplified",
+    0x3F: "400ZR, Single Wavelength, Unamplified",
+    0x46: "ZR400-OFEC-16QAM",
+    0x47: "ZR300-OFEC-8QAM",
+    0x48: "ZR200-OFEC-QPSK",
+    0x49: "ZR100-OFEC-QPSK"
+}
+
+MMF_MEDIA_CODES = {
+    0x00: "Undefined",
+    0x01: "10GBASE-SW (Clause 52)",
+    0x02: "10GBASE-SR (Clause 52)",
+    0x03: "25GBASE-SR (Clause 112)",
+    0x04: "40GBASE-SR4 (Clause 86)",
+    0x05: "40GE SWDM4 MSA Spec",
+    0x06: "40GE BiDi",
+    0x07: "50GBASE-SR (Clause 138)",
+    0x08: "100GBASE-SR10 (Clause 86)",
+    0x09: "100GBASE-SR4 (Clause 95)",
+    0x0A: "100GE SWDM4 MSA Spec",
+    0x0B: "100GE BiDi",
+    0x0C: "100GBASE-SR2 (Clause 138)",
+    0x0D: "100GBASE-SR1 (Clause 167)",
+    0x1D: "100GBASE-VR1 (Clause 167)",
+    0x0E: "200GBASE-SR4 (Clause 138)",
+    0x1B: "200GBASE-SR2 (Clause 167)",
+    0x1E: "200GBASE-VR2 (Clause 167)",
+    0x0F: "400GBASE-SR16 (Clause 123)",
+    0x10: "400GBASE-SR8 (Clause 138)",
+    0x11: "400GBASE-SR4 (Clause 167)",
+    0x1F: "400GBASE-VR4 (Clause 167)",
+    0x12: "800GBASE-SR8 (Placeholder)",
+    0x20: "800GBASE-VR8 (Placeholder)",
+    0x1A: "400GBASE-SR4.2 (Clause 150)",
+    0x13: "8GFC-MM (FC-PI-4)",
+    0x14: "10GFC-MM (10GFC)",
+    0x15: "16GFC-MM (FC-PI-5)",
+    0x16: "32GFC-MM (FC-PI-6)",
+    0x17: "64GFC-MM (FC-PI-7)",
+    0x1C: "128GFC-MM (FC-PI-8)",
+    0x18: "128GFC-MM4 (FC-PI-6P)",
+    0x19: "256GFC-MM4 (FC-PI-7P)"
+}
+
+# Code ranges as (first, last, text), both codes included. Single codes
+# of the tables above take precedence.
+MODULE_TYPE_RANGES = (
+    (0x06, 0x8F, "Custom"),
+    (0x90, 0xFF, "Reserved")
+)
+
+SMF_MEDIA_RANGES = (
+    (0x35, 0x37, "Reserved"),
+    (0x58, 0xBF, "Reserved"),
+    (0xC0, 0xFE, "Vendor Specific/Custom")
+)
+
+MMF_MEDIA_RANGES = (
+    (0x21, 0xBF, "Reserved"),
+    (0xC0, 0xFE, "Vendor Specific/Custom")
+)
+
+UNKNOWN_MODULE_TYPE = "Could not resolve Module Type"
+UNKNOWN_HOST_ELECTRICAL = "Unknown Host Electrial Byte"
+UNKNOWN_MODULE_MEDIA = "Unknown Module Media Byte"
+INVALID_HOST_LANE_COUNT = "Invalid Host Lane Count"
+INVALID_MEDIA_LANE_COUNT = "Invalid Media Lane Count"
+
+# lane counts above 8 are invalid
+MAX_LANE_COUNT = 8
+
+
+def compile_table(codes, ranges=(), default=None):
+    """
+    Compile a code table into a tuple indexed by the byte value.
+
+    :parameter codes: text per code
+    :type codes: dict
+    :parameter ranges: (first, last, text) tuples of code ranges
+    :type ranges: tuple
+    :parameter default: text of codes neither in codes nor in ranges
+    :type default: str
+    :returns:   256 texts
+    :rtype: tuple
+    """
+
+    table = [default] * 256
+    for first, last, text in ranges:
+        table[first:last + 1] = [text] * (last + 1 - first)
+    for code, text in codes.items():
+        table[code] = text
+    return tuple(table)
+
+
+MODULE_TYPE = compile_table(MODULE_TYPE_CODES, MODULE_TYPE_RANGES,
+                            UNKNOWN_MODULE_TYPE)
+HOST_ELECTRICAL = compile_table(HOST_ELECTRICAL_CODES,
+                                default=UNKNOWN_HOST_ELECTRICAL)
+SMF_MEDIA = compile_table(SMF_MEDIA_CODES, SMF_MEDIA_RANGES,
+                          UNKNOWN_MODULE_MEDIA)
+MMF_MEDIA = compile_table(MMF_MEDIA_CODES, MMF_MEDIA_RANGES,
+                          UNKNOWN_MODULE_MEDIA)
+UNKNOWN_MEDIA = compile_table({}, default=UNKNOWN_MODULE_MEDIA)
+
+# media table of every module type, only optical modules have one
+MEDIA_BY_MODULE_TYPE = tuple(
+    SMF_MEDIA if "SMF" in module_type
+    else MMF_MEDIA if "MMF" in module_type
+    else UNKNOWN_MEDIA
+    for module_type in MODULE_TYPE
+)
+
+HOST_LANE_COUNT = tuple(
+    count if count <= MAX_LANE_COUNT else INVALID_HOST_LANE_COUNT
+    for count in range(16)
+)
+MEDIA_LANE_COUNT = tuple(
+    count if count <= MAX_LANE_COUNT else INVALID_MEDIA_LANE_COUNT
+    for count in range(16)
+)
+
+LANE_ASSIGNMENT = tuple(bin(value) for value in range(256))
+
+# host electrical, module media, lane counts, host lane assignment
+DESCRIPTOR = Struct("4B") if Struct else None
+
+# compliance:   the hex string as given
+# module_type:  resolved module type, None if the string is invalid
+# descriptors:  tuple of (host electrical, module media, host lane
+#               count, media lane count, host lane assignment) per
+#               complete application descriptor
+# error:        why the string could not be decoded, None otherwise
+ComplianceRecord = namedtuple("ComplianceRecord", ["compliance", "module_type",
+                                                   "descriptors", "error"])
+
+# maximum number of distinct strings remembered by decode_many()
+DECODE_CACHE_SIZE = 65536
+
+
+def has_media_mapping(module_type):
+    """
+    Whether the media interface codes of a module type can be resolved.
+
+    :parameter module_type: resolved module type
+    :type module_type: str
+    :rtype: bool
+    """
+
+    return "SMF" in module_type or "MMF" in module_type
+
+
+def compliance_bytes(hex_string):
+    """
+    Convert an optical compliance hex string into its bytes.
+
+    A trailing half byte is ignored like an incomplete descriptor.
+
+    :parameter hex_string: optical compliance as provided by SROS,
+                           e.g. "02:11:04:84:01"
+    :type hex_string: str
+    :rtype: bytes
+    :raises ValueError: Error if hex_string holds no hex bytes.
+    """
+
+    hex_digits = hex_string.replace(":", "")
+    data = bytes.fromhex(hex_digits[:len(hex_digits) // 2 * 2])
+    if not data:
+        raise ValueError("empty optical compliance")
+    return data
+
+
+def decode_compliance(hex_string):
+    """
+    Decode an optical compliance hex string into resolved values.
+
+    :parameter hex_string: optical compliance as provided by SROS,
+                           e.g. "02:11:04:84:01"
+    :type hex_string: str
+    :returns:   The resolved module type and a tuple of the resolved
+                values of every complete application descriptor.
+    :rtype: tuple
+    :raises ValueError: Error if hex_string holds no hex bytes.
+    """
+
+    if DESCRIPTOR is None:
+        module_type, descriptors = resolve_compliance(hex_string)
+        return module_type, tuple(tuple(descriptor)
+                                  for descriptor in descriptors)
+
+    data = compliance_bytes(hex_string)
+    media = MEDIA_BY_MODULE_TYPE[data[0]]
+    end = 1 + (len(data) - 1) // DESCRIPTOR.size * DESCRIPTOR.size
+
+    return MODULE_TYPE[data[0]], tuple(
+        (
+            HOST_ELECTRICAL[host_electrical],
+            media[module_media],
+            HOST_LANE_COUNT[lane_counts >> 4],
+            MEDIA_LANE_COUNT[lane_counts & 0x0F],
+            LANE_ASSIGNMENT[lane_assignment],
+        )
+        for host_electrical, module_media, lane_counts, lane_assignment
+        in DESCRIPTOR.iter_unpack(memoryview(data)[1:end])
+    )
+
+
+def decode_many(hex_strings, cache=None):
+    """
+    Generator decoding many optical compliance hex strings.
+
+    Leading and trailing whitespace is ignored, so the lines of a file
+    can be passed directly, blank lines are skipped. Every distinct
+    string is decoded once and the same record is returned for all of
+    its occurrences. Strings that cannot be decoded result in a record
+    holding the error instead of stopping the generator.
+
+    :parameter hex_strings: optical compliance hex strings
+    :type hex_strings: iterable
+    :parameter cache: records by string, kept between calls if given
+    :type cache: dict
+    :returns:   A ComplianceRecord per string.
+    :rtype: generator
+    """
+
+    if cache is None:
+        cache = {}
+    for hex_string in hex_strings:
+        hex_string = hex_string.strip()
+        if not hex_string:
+            continue
+        record = cache.get(hex_string)
+        if record is None:
+            try:
+                module_type, descriptors = decode_compliance(hex_string)
+                record = ComplianceRecord(hex_string, module_type,
+                                          descriptors, None)
+            except ValueError as error:
+                record = ComplianceRecord(hex_string, None, (), str(error))
+            if len(cache) >= DECODE_CACHE_SIZE:
+                cache.clear()
+            cache[hex_string] = record
+        yield record
+
+
+def resolve_compliance(hex_string):
+    """
+    Resolve an optical compliance hex string according to the optical
+    compliance mapping tables.
+
+    :parameter hex_string: optical compliance as provided by SROS,
+                           e.g. "02:11:04:84:01"
+    :type hex_string: str
+    :returns:   The resolved module type and the resolved values of
+                every complete application descriptor.
+    :rtype: tuple
+    :raises ValueError: Error if hex_string holds no hex bytes.
+    """
+
+    data = compliance_bytes(hex_string)
+    media = MEDIA_BY_MODULE_TYPE[data[0]]
+
+    resolved_data_set = []
+    for offset in range(1, len(data) - 3, 4):
+        lane_counts = data[offset + 2]
+        resolved_data_set.append([
+            HOST_ELECTRICAL[data[offset]],
+            media[data[offset + 1]],
+            HOST_LANE_COUNT[lane_counts >> 4],
+            MEDIA_LANE_COUNT[lane_counts & 0x0F],
+            LANE_ASSIGNMENT[data[offset + 3]],
+        ])
+
+    return MODULE_TYPE[data[0]], resolved_data_set
@@ -0,0 +1,719 @@
+#!/usr/bin/env python3
+
+"""
+Offline stand-in for pysros.management.connect().
+
+FakeConnection answers running.get(), convert(), list_paths() and
+disconnect() like a pySROS Connection, from synthetically generated data
+or from fixtures recorded on a real node. It lets the scripts of this
+repo be run, load-tested and benchmarked without an SR OS node.
+
+All scripts use it instead of a real session when the SROS_FAKE
+environment variable is set, see sros_session.py. The variable holds
+comma separated settings, e.g.
+
+    SROS_FAKE="routes=1000000,tunnels=2000,lsps=2000,latency=0.05"
+    SROS_FAKE="fixture=r1.json,latency=0.01"
+
+Settings (see DEFAULT_SETTINGS):
+
+    services        VPRN services per node
+    routes          routes per VPRN service and address family
+    interfaces      interfaces per VPRN service
+    tunnels         tunnels in the Base IPv4 tunnel table
+    lsps            MPLS LSPs, using the first tunnels
+    ports           ports with a transceiver
+    config_services VPRN services in the configuration
+    commits         commit-id of the latest commit
+    latency         seconds added to every running.get()
+    connect_latency seconds added to every connect()
+    jitter          random share of the latencies, 0.2 means +-20%
+    failure_rate    share of connect() calls that fail
+    seed            seed of the generated data and the jitter
+    fixture         JSON file recorded with "sros_fake.py record",
+                    its paths are served instead of generated data
+
+Routes, tunnels and configuration are generated once per settings and
+shared by all connections, so a thousand fake nodes cost little more
+memory than one.
+"""
+
+import argparse
+import json
+import random
+import re
+import sys
+import threading
+import time
+from pysros.management import Empty
+from pysros.wrappers import Container, Leaf, LeafList
+
+DEFAULT_SETTINGS = {
+    "services": 10,
+    "routes": 1000,
+    "interfaces": 10,
+    "tunnels": 100,
+    "lsps": 100,
+    "ports": 32,
+    "config_services": 100,
+    "commits": 1,
+    "latency": 0.0,
+    "connect_latency": 0.0,
+    "jitter": 0.0,
+    "failure_rate": 0.0,
+    "seed": 1,
+    "fixture": None,
+}
+
+# key leaves of the YANG lists the fake serves, needed to turn JSON
+# arrays back into keyed lists
+LIST_KEYS = {
+    "vprn": ("service-name",),
+    "interface": ("interface-name",),
+    "route": ("ipv4-prefix",),
+    "nexthop": ("nexthop-index",),
+    "resolving-nexthop": ("resolving-nexthop-index",),
+    "tunnel": ("ipv4-prefix", "protocol", "id"),
+    "lsp": ("lsp-name",),
+    "port": ("port-id",),
+    "router": ("router-name",),
+    "commit-id": ("commit-id",),
+    "sap": ("sap-id",),
+}
+
+TUNNEL_PROTOCOLS = ("rsvp", "sr-te", "sr-isis", "ldp")
+
+# module type, then application descriptors of host electrical code,
+# media code, lane counts and host lane assignment
+OPTICAL_COMPLIANCE = (
+    "02:11:04:84:01:11:16:84:01:0f:14:84:01",
+    "01:11:03:84:01:0c:02:44:01",
+    "02:0b:06:44:01:11:1d:84:01",
+)
+
+
+def parse_settings(spec):
+    """
+    Parse the value of the SROS_FAKE environment variable.
+
+    :parameter spec: comma separated name=value pairs
+    :type spec: str
+    :returns: the settings, defaults for everything not given
+    :rtype: dict
+    :raises ValueError: Error for unknown settings.
+    """
+    settings = dict(DEFAULT_SETTINGS)
+    for item in spec.split(","):
+        item = item.strip()
+        if not item or item in ("1", "true", "yes"):
+            continue
+        name, _, value = item.partition("=")
+        name = name.strip().replace("-", "_")
+        if name not in settings:
+            raise ValueError("unknown SROS_FAKE setting " + repr(name))
+        if name == "fixture":
+            settings[name] = value.strip()
+        elif isinstance(DEFAULT_SETTINGS[name], int):
+            settings[name] = int(value)
+        else:
+            settings[name] = float(value)
+    return settings
+
+
+def normalize_path(path):
+    """Strip YANG module prefixes and key quotes from an xpath."""
+    path = re.sub(r"/[\w-]+:", "/", path)
+    path = re.sub(r"=(['\"])(.*?)\1\]", r"=\2]", path)
+    return path.rstrip("/") or "/"
+
+
+def split_path(path):
+    """Split a normalized xpath into (name, {key: value}) steps."""
+    steps = []
+    for step in re.findall(r"[^/\[]+(?:\[[^\]]*\])*", path):
+        name = step.split("[", 1)[0]
+        keys = dict(re.findall(r"\[([\w-]+)=([^\]]*)\]", step))
+        steps.append((name, keys))
+    return steps
+
+
+def dump_tree(node):
+    """
+    Encode a pySROS data structure as JSON data without losing the
+    wrapper types or the keys of lists.
+    """
+    if isinstance(node, Container):
+        return {"container": dict((name, dump_tree(child))
+                                  for name, child in node.data.items())}
+    if isinstance(node, LeafList):
+        return {"leaf-list": list(node.data)}
+    if isinstance(node, Leaf):
+        if node.data is Empty:
+            return {"empty": None}
+        return {"leaf": node.data}
+    if isinstance(node, dict):
+        return {"list": [[list(key) if isinstance(key, tuple) else key,
+                          dump_tree(entry)]
+                         for key, entry in node.items()]}
+    return {"leaf": node}
+
+
+def load_tree(data):
+    """Decode JSON data written by dump_tree()."""
+    if "container" in data:
+        return Container(dict((name, load_tree(child))
+                              for name, child in data["container"].items()))
+    if "leaf-list" in data:
+        return LeafList(data["leaf-list"])
+    if "empty" in data:
+        return Leaf(Empty)
+    if "list" in data:
+        return dict((tuple(key) if isinstance(key, list) else key,
+                     load_tree(entry))
+                    for key, entry in data["list"])
+    return Leaf(data["leaf"])
+
+
+def to_plain(node):
+    """Convert a pySROS data structure into plain JSON data."""
+    if isinstance(node, Container):
+        return dict((name, to_plain(child))
+                    for name, child in node.data.items())
+    if isinstance(node, LeafList):
+        return list(node.data)
+    if isinstance(node, Leaf):
+        return [None] if node.data is Empty else node.data
+    if isinstance(node, dict):
+        return [to_plain(node[key]) for key in node]
+    return node
+
+
+def from_plain(data, name=None):
+    """Convert plain JSON data back into a pySROS data structure."""
+    if isinstance(data, dict):
+        members = {}
+        for child, value in data.items():
+            child = child.split(":")[-1]
+            members[child] = from_plain(value, child)
+        return Container(members)
+    if isinstance(data, list):
+        if data == [None]:
+            return Leaf(Empty)
+        if name in LIST_KEYS:
+            entries = {}
+            for entry in data:
+                key = tuple(entry[leaf] for leaf in LIST_KEYS[name]
+                            if leaf in entry)
+                key = key[0] if len(key) == 1 else key
+                entries[key] = from_plain(entry, name)
+            return entries
+        return LeafList(data)
+    return Leaf(data)
+
+
+def apply_filter(node, filter):
+    """
+    Apply a pySROS get() filter of content match and selection nodes.
+
+    Content match nodes keep list entries whose leaf equals the value,
+    selection nodes ({}) restrict the returned members. Key leaves are
+    always returned.
+    """
+    if isinstance(node, dict):
+        result = {}
+        for key, entry in node.items():
+            selected = apply_filter(entry, filter)
+            if selected is not None:
+                result[key] = selected
+        return result
+    if not isinstance(node, Container):
+        return node
+
+    members = node.data
+    selections = []
+    for name, value in filter.items():
+        if isinstance(value, dict):
+            selections.append(name)
+        elif name not in members:
+            return None
+        elif (str(getattr(members[name], "data", None)).strip()
+              != str(value).strip()):
+            return None
+    if not selections:
+        return node
+
+    keys = set(leaf for leaves in LIST_KEYS.values() for leaf in leaves)
+    selected = dict((name, member) for name, member in members.items()
+                    if name in keys or name in filter
+                    and not isinstance(filter[name], dict))
+    for name in selections:
+        if name not in members:
+            continue
+        if filter[name]:
+            selected[name] = apply_filter(members[name], filter[name])
+        else:
+            selected[name] = members[name]
+    return Container(selected)
+
+
+class FakeNode:
+    """
+    Synthetic data of a fake SR OS node.
+
+    Instances are cached by settings, the data of a path is generated
+    when first requested and shared by all connections afterwards.
+    """
+
+    _instances = {}
+    _instances_lock = threading.Lock()
+
+    @classmethod
+    def get_instance(cls, settings):
+        key = tuple(sorted(settings.items()))
+        with cls._instances_lock:
+            if key not in cls._instances:
+                cls._instances[key] = cls(settings)
+            return cls._instances[key]
+
+    def __init__(self, settings):
+        self.settings = settings
+        self._cache = {}
+        self._lock = threading.RLock()
+        self._fixture = {}
+        if settings["fixture"]:
+            with open(settings["fixture"]) as f:
+                self._fixture = json.load(f)["paths"]
+        self._patterns = (
+            (r"/state/service/vprn", self._vprn_state),
+            (r"/state/service/vprn\[service-name=([^\]]+)\]"
+             r"/route-table/unicast/(ipv4|ipv6)/route", self._routes),
+            (r"/state/service/vprn\[service-name=([^\]]+)\]/interface",
+             self._interfaces),
+            (r"/state/router\[router-name=Base\]/tunnel-table/(ipv4|ipv6)"
+             r"/tunnel", self._tunnels),
+            (r"/state/router\[router-name=Base\]/mpls/lsp", self._lsps),
+            (r"/state/port\[port-id=([^\]]+)\]/transceiver/optical-compliance",
+             self._optical_compliance),
+            (r"/state/port", self._ports),
+        )
+
+    def get(self, host, path):
+        """
+        The data of a path as pySROS data structure.
+
+        :raises LookupError: Error if the fake does not serve the path.
+        """
+        path = normalize_path(path)
+        if path in self._fixture:
+            return self._cached(path, lambda: load_tree(self._fixture[path]))
+
+        if path == "/state/system/oper-name":
+            return Leaf(host or "localhost")
+        if path == ("/state/system/management-interface/commit-history"
+                    "/commit-id"):
+            commit = self.settings["commits"]
+            return {commit: Container({"commit-id": Leaf(commit)})}
+        if path == "/configure" or path.startswith("/configure/"):
+            return self._navigate(self.configuration(host),
+                                  split_path(path)[1:], path)
+
+        for pattern, generate in self._patterns:
+            match = re.fullmatch(pattern, path)
+            if match:
+                return self._cached(path, lambda: generate(*match.groups()))
+        raise LookupError("path " + path + " is not served by the fake node")
+
+    def _cached(self, key, generate):
+        with self._lock:
+            if key not in self._cache:
+                self._cache[key] = generate()
+            return self._cache[key]
+
+    def _navigate(self, node, steps, path):
+        for name, keys in steps:
+            if not isinstance(node, Container) or name not in node.data:
+                raise LookupError("path " + path + " does not exist")
+            node = node.data[name]
+            if keys:
+                key = tuple(keys.values())
+                key = key[0] if len(key) == 1 else key
+                if not isinstance(node, dict) or key not in node:
+                    raise LookupError("path " + path + " does not exist")
+                node = node[key]
+        return node
+
+    def service_names(self):
+        return ["VPRN_" + str(index)
+                for index in range(1, self.settings["services"] + 1)]
+
+    def _vprn_state(self):
+        vprns = {}
+        for index, name in enumerate(self.service_names(), 1):
+            vprns[name] = Container({
+                "service-name": Leaf(name),
+                "oper-service-id": Leaf(index),
+                "oper-state": Leaf("up"),
+                "customer": Leaf("1"),
+            })
+        return vprns
+
+    def _interfaces(self, service_name):
+        interfaces = {}
+        for index in range(1, self.settings["interfaces"] + 1):
+            name = service_name.lower() + "-itf" + str(index)
+            interfaces[name] = Container({
+                "interface-name": Leaf(name),
+                "if-index": Leaf(index + 1),
+                "oper-state": Leaf("up"),
+            })
+        return interfaces
+
+    def _tunnels(self, family):
+        if family != "ipv4":
+            return {}
+        tunnels = {}
+        for index in range(1, self.settings["tunnels"] + 1):
+            endpoint = "192.0.{}.{}/32".format(index // 256, index % 256)
+            protocol = TUNNEL_PROTOCOLS[index % len(TUNNEL_PROTOCOLS)]
+            tunnels[(endpoint, protocol, index)] = Container({
+                "ipv4-prefix": Leaf(endpoint),
+                "protocol": Leaf(protocol),
+                "id": Leaf(index),
+                "preference": Leaf(7),
+            })
+        return tunnels
+
+    def _lsps(self):
+        lsps = {}
+        count = min(self.settings["lsps"], self.settings["tunnels"])
+        for index in range(1, count + 1):
+            name = "lsp-" + str(index)
+            lsps[name] = Container({
+                "lsp-name": Leaf(name),
+                "ttm-tunnel-id": Leaf(index),
+                "oper-state": Leaf("up"),
+            })
+        return lsps
+
+    def _routes(self, service_name, family):
+        settings = self.settings
+        rng = random.Random(str(settings["seed"]) + service_name + family)
+        interfaces = max(1, settings["interfaces"])
+        tunnels = max(1, settings["tunnels"])
+
+        # routes share their immutable leaves and next-hops, which keeps
+        # generating a million routes within seconds
+        local = [Leaf("local"), Leaf(0)]
+        remote = [Leaf("bgp-vpn"), Leaf(170)]
+        local_next_hops = [
+            {0: Container({"nexthop-index": Leaf(0),
+                           "if-index": Leaf(index + 2)})}
+            for index in range(interfaces)
+        ]
+        tunnel_next_hops = []
+        for index in range(1, tunnels + 1):
+            protocol = TUNNEL_PROTOCOLS[index % len(TUNNEL_PROTOCOLS)]
+            resolving = Container({
+                "resolving-nexthop-index": Leaf(0),
+                "nexthop-ip": Leaf("192.0.{}.{}".format(index // 256,
+                                                        index % 256)),
+                "nexthop-tunnel-type": Leaf(protocol),
+                "nexthop-tunnel-id": Leaf(index),
+            })
+            tunnel_next_hops.append({0: Container({
+                "nexthop-index": Leaf(0),
+                "resolving-nexthop": {0: resolving},
+            })})
+        ages = [Leaf(age) for age in range(0, 86400 * 30, 3607)]
+
+        routes = {}
+        for index in range(settings["routes"]):
+            if family == "ipv4":
+                prefix = "{}.{}.{}.0/24".format(
+                    10 + index // 65536, index // 256 % 256, index % 256)
+            else:
+                prefix = "2001:db8:{:x}:{:x}::/64".format(
+                    index // 65536, index % 65536)
+            if index < interfaces:
+                protocol, preference = local
+                next_hop = local_next_hops[index]
+            else:
+                protocol, preference = remote
+                next_hop = tunnel_next_hops[rng.randrange(tunnels)]
+            routes[prefix] = Container({
+                "ipv4-prefix": Leaf(prefix),
+                "protocol": protocol,
+                "preference": preference,
+                "age": ages[rng.randrange(len(ages))],
+                "nexthop": next_hop,
+            })
+        return routes
+
+    def _ports(self):
+        ports = {}
+        for index in range(1, self.settings["ports"] + 1):
+            port_id = "1/1/c" + str(index)
+            compliance = OPTICAL_COMPLIANCE[index % len(OPTICAL_COMPLIANCE)]
+            ports[port_id] = Container({
+                "port-id": Leaf(port_id),
+                "transceiver": Container({
+                    "optical-compliance": Leaf(compliance),
+                }),
+            })
+        return ports
+
+    def _optical_compliance(self, port_id):
+        ports = self._cached("/state/port", self._ports)
+        if port_id not in ports:
+            raise LookupError("port " + port_id + " does not exist")
+        return ports[port_id]["transceiver"]["optical-compliance"]
+
+    def configuration(self, host):
+        """
+        The /configure tree of a node. Only the system name differs
+        between hosts, all other branches are shared.
+        """
+        shared = self._cached("/configure", self._configuration)
+        members = dict(shared.data)
+        system = dict(members["system"].data)
+        system["name"] = Leaf(host or "localhost")
+        members["system"] = Container(system)
+        return Container(members)
+
+    def _configuration(self):
+        vprns = {}
+        for index in range(1, self.settings["config_services"] + 1):
+            name = "VPRN_" + str(index)
+            vprns[name] = Container({
+                "service-name": Leaf(name),
+                "service-id": Leaf(index),
+                "customer": Leaf("1"),
+                "admin-state": Leaf("enable"),
+                "description": Leaf("generated service " + str(index)),
+                "autonomous-system": Leaf(64496),
+                "route-distinguisher": Leaf("64496:" + str(index)),
+                "interface": {
+                    "itf-" + str(index): Container({
+                        "interface-name": Leaf("itf-" + str(index)),
+                        "admin-state": Leaf("enable"),
+                        "ipv4": Container({"primary": Container({
+                            "address": Leaf("10.{}.{}.1".format(
+                                index // 256, index % 256)),
+                            "prefix-length": Leaf(24),
+                        })}),
+                    }),
+                },
+            })
+        ports = {}
+        for index in range(1, self.settings["ports"] + 1):
+            port_id = "1/1/c" + str(index)
+            ports[port_id] = Container({
+                "port-id": Leaf(port_id),
+                "admin-state": Leaf("enable"),
+                "description": Leaf("port " + port_id),
+            })
+        return Container({
+            "system": Container({"name": Leaf("localhost"),
+                                 "location": Leaf("lab")}),
+            "port": ports,
+            "router": {"Base": Container({
+                "router-name": Leaf("Base"),
+                "autonomous-system": Leaf(64496),
+                "mpls": Container({"admin-state": Leaf("enable")}),
+            })},
+            "service": Container({"vprn": vprns}),
+        })
+
+
+class FakeDatastore:
+    """Stand-in for pysros.management.Datastore."""
+
+    def __init__(self, connection):
+        self._connection = connection
+
+    def get(self, path, *, defaults=False, config_only=False, filter=None):
+        connection = self._connection
+        connection._delay(connection.settings["latency"])
+        data = connection.node.get(connection.host, path)
+        if filter:
+            data = apply_filter(data, filter)
+        return data
+
+
+class FakeConnection:
+    """
+    Stand-in for pysros.management.Connection.
+
+    :parameter host: hostname of the fake node
+    :type host: str
+    :parameter settings: settings as returned by parse_settings()
+    :type settings: dict
+    """
+
+    def __init__(self, host=None, settings=None):
+        self.host = host
+        self.settings = settings or dict(DEFAULT_SETTINGS)
+        self.node = FakeNode.get_instance(self.settings)
+        self.running = FakeDatastore(self)
+        self._random = random.Random(str(self.settings["seed"])
+                                     + str(host))
+
+    def _delay(self, seconds):
+        if seconds > 0:
+            jitter = self.settings["jitter"]
+            factor = 1 + self._random.uniform(-jitter, jitter)
+            time.sleep(seconds * factor)
+
+    def convert(self, path, payload, *, source_format, destination_format,
+                pretty_print=False):
+        """
+        Convert between pysros and json, xml is not supported.
+
+        :raises ValueError: Error for any other source_format or
+                            destination_format.
+        """
+        if source_format == "json":
+            data = json.loads(payload) if isinstance(payload, str) else payload
+            name = None
+            if path != "/":
+                name = split_path(normalize_path(path))[-1][0]
+            payload = from_plain(data, name)
+        elif source_format != "pysros":
+            raise ValueError("unsupported source_format "
+                             + repr(source_format) + ", the fake connection"
+                             " only converts pysros and json")
+
+        if destination_format == "pysros":
+            return payload
+        if destination_format == "json":
+            return json.dumps(to_plain(payload),
+                              indent=4 if pretty_print else None)
+        raise ValueError("unsupported destination_format "
+                         + repr(destination_format) + ", the fake connection"
+                         " only converts pysros and json")
+
+    def list_paths(self, path):
+        """
+        Schema paths of path and all its descendants, derived from the
+        data of the fake node. Lists carry the names of their keys,
+        e.g. /nokia-conf:configure/service/vprn[service-name].
+        """
+        node = self.node.get(self.host, path)
+        path = path.rstrip("/")
+        if isinstance(node, dict):
+            name = path.rsplit("/", 1)[-1]
+            path += "".join("[" + leaf + "]"
+                            for leaf in LIST_KEYS.get(name, ()))
+        seen = set()
+
+        def walk(schema_path, node):
+            if schema_path not in seen:
+                seen.add(schema_path)
+                yield schema_path
+            entries = node.values() if isinstance(node, dict) else [node]
+            for entry in entries:
+                if not isinstance(entry, Container):
+                    continue
+                for name, member in entry.data.items():
+                    child_path = schema_path + "/" + name
+                    if isinstance(member, dict):
+                        child_path += "".join(
+                            "[" + leaf + "]"
+                            for leaf in LIST_KEYS.get(name, ()))
+                    yield from walk(child_path, member)
+
+        yield from walk(path, node)
+
+    def disconnect(self):
+        pass
+
+
+def connect(host=None, username=None, password=None, port=830, settings=None,
+            **kwargs):
+    """
+    Stand-in for pysros.management.connect().
+
+    :parameter settings: settings as returned by parse_settings()
+    :type settings: dict
+    :returns: Connection object for the fake node.
+    :rtype: FakeConnection
+    :raises RuntimeError: Error for the share of connects given by the
+                          failure_rate setting.
+    """
+    settings = settings or dict(DEFAULT_SETTINGS)
+    connection_object = FakeConnection(host, settings)
+    connection_object._delay(settings["connect_latency"])
+    failure_rate = settings["failure_rate"]
+    if failure_rate and random.random() < failure_rate:
+        raise RuntimeError("fake connection to " + str(host) + " refused")
+    return connection_object
+
+
+def connect_function(spec):
+    """
+    A connect() function bound to the settings given in spec.
+
+    :parameter spec: value of the SROS_FAKE environment variable
+    :type spec: str
+    :rtype: callable
+    """
+    settings = parse_settings(spec)
+
+    def fake_connect(**kwargs):
+        return connect(settings=settings, **kwargs)
+
+    return fake_connect
+
+
+def record(connection_object, paths, filepath):
+    """
+    Record the data of paths on a real node as fixture file.
+
+    :parameter connection_object: The connection object
+    :type connection_object: :py:class:`pysros.management.Connection`
+    :parameter paths: paths to record
+    :type paths: list
+    :parameter filepath: path of the fixture file
+    :type filepath: str
+    """
+    fixture = {"paths": {}}
+    for path in paths:
+        data = connection_object.running.get(path)
+        fixture["paths"][normalize_path(path)] = dump_tree(data)
+    with open(filepath, "w") as f:
+        json.dump(fixture, f)
+
+
+def main():
+    """
+    Command line interface to record fixtures from a real node.
+    """
+    from pysros.management import connect as sros_connect
+
+    parser = argparse.ArgumentParser(
+        description="Record fixtures for the fake pySROS connection.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    recordParser = subparsers.add_parser(
+        "record", help="record paths of a node into a fixture file")
+    recordParser.add_argument("host")
+    recordParser.add_argument("path", nargs="+", help="xpath to record")
+    recordParser.add_argument("-u", "--username", required=True)
+    recordParser.add_argument("-p", "--password", required=True)
+    recordParser.add_argument("--port", type=int, default=830)
+    recordParser.add_argument("-o", "--output", required=True,
+                              help="fixture file")
+    args = parser.parse_args()
+
+    connection_object = sros_connect(host=args.host, username=args.username,
+                                     password=args.password, port=args.port,
+                                     hostkey_verify=False)
+    try:
+        record(connection_object, args.path, args.output)
+    finally:
+        connection_object.disconnect()
+    print("Recorded " + str(len(args.path)) + " path(s) to " + args.output,
+          file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
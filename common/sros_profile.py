@@ -0,0 +1,427 @@
+#!/usr/bin/env python3
+
+"""
+Opt-in timing of the phases of a script run.
+
+When profiling is enabled every session opened through sros_session.py
+is instrumented: opening it is timed as the "connect" phase, every
+running.get() as the "rpc" phase and every convert() as the "convert"
+phase, the latter two also per path. The scripts add their own phases
+such as "resolve" or "output" around their processing steps.
+
+Time is accounted to the innermost active phase only, so the phases of
+a run add up instead of overlapping, e.g. the rows of a route table
+that are fetched while printing count as "rpc", not as "output". Time
+of concurrent threads is summed, hence the phases may add up to more
+than the wall time of a multi-threaded run.
+
+Bytes received are the size of the NETCONF replies. They are only known
+for connections of pysros.management.connect(), the offline stand-in
+sros_fake.py reports none.
+
+Profiling is enabled by the --profile option of a script or the
+environment, the report is written to stderr when the script exits:
+
+    SROS_PROFILE            "table" or "json", any other non-empty
+                            value selects "table"
+    SROS_PROFILE_FILE       write the report into this file instead
+    SROS_PROFILE_METRICS    additionally write the counters in the
+                            OpenMetrics text format into this file,
+                            e.g. for a node exporter textfile collector
+
+Copy this file next to sros_session.py when a script is copied on its
+own. Without it nothing is profiled.
+"""
+
+import json
+import os
+import sys
+import time
+from contextlib import contextmanager
+
+try:
+    import threading
+except ImportError:
+    # the SR OS on-box interpreter may come without threading
+    threading = None
+
+try:
+    import atexit
+except ImportError:
+    atexit = None
+
+
+FORMATS = ("table", "json")
+
+# the NETCONF operations of ncclient returning data
+_DATA_OPERATIONS = ("get", "get_config", "rpc")
+
+
+class _Frame:
+    """Active phase of a thread."""
+
+    __slots__ = ("name", "xpath", "resumed", "seconds", "received")
+
+    def __init__(self, name, xpath, now):
+        self.name = name
+        self.xpath = xpath
+        self.resumed = now
+        self.seconds = 0.0
+        self.received = 0
+
+
+class _CountingManager:
+    """Proxy of an ncclient Manager counting the bytes of the replies."""
+
+    def __init__(self, manager, profiler):
+        self._manager = manager
+        self._profiler = profiler
+
+    def __getattr__(self, name):
+        attribute = getattr(self._manager, name)
+        if name not in _DATA_OPERATIONS:
+            return attribute
+
+        def operation(*args, **kwargs):
+            reply = attribute(*args, **kwargs)
+            self._profiler.add_received(len(getattr(reply, "xml", None) or ""))
+            return reply
+
+        return operation
+
+
+class Profiler:
+    """
+    Collects calls, seconds and bytes received per phase and per path.
+
+    :parameter script: name of the profiled script, used as label of
+                       the OpenMetrics output
+    :type script: str
+    """
+
+    def __init__(self, script=None):
+        self.script = script or os.path.basename(sys.argv[0] or "python")
+        self.enabled = False
+        self.output_format = "table"
+        self.output_file = None
+        self.metrics_file = None
+        self._started = time.monotonic()
+        self._phases = {}
+        self._xpaths = {}
+        self._lock = threading.Lock() if threading else None
+        self._local = threading.local() if threading else None
+        self._main_stack = []
+
+    def enable(self, output_format="table", output_file=None,
+               metrics_file=None):
+        """
+        Start profiling and report the result when the script exits.
+
+        :parameter output_format: "table" or "json"
+        :type output_format: str
+        :parameter output_file: file of the report, None for stderr
+        :type output_file: str
+        :parameter metrics_file: file of the OpenMetrics output, None
+                                 to skip it
+        :type metrics_file: str
+        """
+        if output_format not in FORMATS:
+            raise ValueError("unknown profile format " + repr(output_format))
+        self.output_format = output_format
+        self.output_file = output_file
+        self.metrics_file = metrics_file
+        if not self.enabled:
+            self.enabled = True
+            self._started = time.monotonic()
+            if atexit:
+                atexit.register(self.write)
+
+    def _stack(self):
+        if self._local is None:
+            return self._main_stack
+        try:
+            return self._local.stack
+        except AttributeError:
+            self._local.stack = []
+            return self._local.stack
+
+    def _record(self, frame, calls):
+        key = frame.name
+        if self._lock is not None:
+            self._lock.acquire()
+        try:
+            totals = self._phases.setdefault(key, [0, 0.0, 0])
+            totals[0] += calls
+            totals[1] += frame.seconds
+            totals[2] += frame.received
+            if frame.xpath is not None:
+                totals = self._xpaths.setdefault((key, frame.xpath),
+                                                 [0, 0.0, 0])
+                totals[0] += calls
+                totals[1] += frame.seconds
+                totals[2] += frame.received
+        finally:
+            if self._lock is not None:
+                self._lock.release()
+
+    def _enter(self, name, xpath):
+        stack = self._stack()
+        now = time.perf_counter()
+        if stack:
+            parent = stack[-1]
+            parent.seconds += now - parent.resumed
+        frame = _Frame(name, xpath, now)
+        stack.append(frame)
+        return frame
+
+    def _exit(self, calls=1):
+        stack = self._stack()
+        now = time.perf_counter()
+        frame = stack.pop()
+        frame.seconds += now - frame.resumed
+        self._record(frame, calls)
+        if stack:
+            stack[-1].resumed = now
+
+    @contextmanager
+    def phase(self, name, xpath=None):
+        """
+        Context manager accounting the time of the block to a phase.
+
+        :parameter name: name of the phase
+        :type name: str
+        :parameter xpath: path the phase works on, counted separately
+        :type xpath: str
+        """
+        if not self.enabled:
+            yield
+            return
+        self._enter(name, xpath)
+        try:
+            yield
+        finally:
+            self._exit()
+
+    def iterate(self, iterable, name):
+        """
+        Account the time spent producing the items of an iterable.
+
+        The items are counted as calls of the phase. The iterable is
+        returned unchanged if profiling is disabled.
+
+        :parameter iterable: typically a generator doing the work lazily
+        :type iterable: iterable
+        :parameter name: name of the phase
+        :type name: str
+        :rtype: iterable
+        """
+        if not self.enabled:
+            return iterable
+        return self._iterate(iter(iterable), name)
+
+    def _iterate(self, iterator, name):
+        while True:
+            self._enter(name, None)
+            try:
+                item = next(iterator)
+            except StopIteration:
+                self._exit(calls=0)
+                return
+            except BaseException:
+                self._exit(calls=0)
+                raise
+            self._exit()
+            yield item
+
+    def add_received(self, count):
+        """Add bytes received to the innermost active phase."""
+        stack = self._stack()
+        if stack:
+            stack[-1].received += count
+
+    def instrument(self, connection_object):
+        """
+        Account the requests of a Connection object to the phases
+        "rpc" and "convert".
+
+        The object is changed in place so that it stays usable as key of
+        a session pool. Nothing is done if profiling is disabled.
+
+        :parameter connection_object: Connection object to instrument
+        :type connection_object: :py:class:`pysros.management.Connection`
+        :returns: connection_object
+        :rtype: :py:class:`pysros.management.Connection`
+        """
+        if not self.enabled:
+            return connection_object
+
+        manager = getattr(connection_object, "_nc", None)
+        if manager is not None and not isinstance(manager, _CountingManager):
+            connection_object._nc = _CountingManager(manager, self)
+
+        datastore = connection_object.running
+        get = datastore.get
+        convert = connection_object.convert
+
+        def timed_get(path, **kwargs):
+            with self.phase("rpc", path):
+                return get(path, **kwargs)
+
+        def timed_convert(path, payload, **kwargs):
+            with self.phase("convert", path):
+                return convert(path, payload, **kwargs)
+
+        datastore.get = timed_get
+        connection_object.convert = timed_convert
+        return connection_object
+
+    def summary(self):
+        """
+        The counters collected so far.
+
+        :returns: wall time of the run, phases and paths with their
+                  calls, seconds and bytes received
+        :rtype: dict
+        """
+        def entries(counters, names):
+            return [
+                dict(zip(names, key if isinstance(key, tuple) else (key,)),
+                     calls=calls, seconds=round(seconds, 6), received=received)
+                for key, (calls, seconds, received) in sorted(
+                    counters.items(), key=lambda item: -item[1][1])
+            ]
+
+        return {
+            "script": self.script,
+            "wall": round(time.monotonic() - self._started, 6),
+            "phases": entries(self._phases, ("phase",)),
+            "xpaths": entries(self._xpaths, ("phase", "xpath")),
+        }
+
+    def format_table(self, summary=None):
+        """The summary as human-readable text."""
+        summary = summary or self.summary()
+        rows = [("Phase", summary["phases"], lambda entry: entry["phase"])]
+        if summary["xpaths"]:
+            rows.append(("Path", summary["xpaths"],
+                         lambda entry: entry["phase"] + " " + entry["xpath"]))
+        width = max([24] + [len(name(entry))
+                            for _, entries, name in rows for entry in entries])
+        line = "{:<" + str(width) + "} {:>9} {:>11} {:>13}"
+
+        lines = ["Profile of {} (wall time {:.3f}s)".format(
+            summary["script"], summary["wall"])]
+        for title, entries, name in rows:
+            lines.append("")
+            lines.append(line.format(title, "Calls", "Seconds", "Bytes"))
+            lines.append("-" * (width + 36))
+            for entry in entries:
+                lines.append(line.format(name(entry), entry["calls"],
+                                         "{:.3f}".format(entry["seconds"]),
+                                         entry["received"]))
+        return "\n".join(lines) + "\n"
+
+    def format_openmetrics(self, summary=None):
+        """The summary in the OpenMetrics text exposition format."""
+        summary = summary or self.summary()
+        script = _label_value(summary["script"])
+        lines = [
+            "# TYPE sros_run_seconds gauge",
+            "# HELP sros_run_seconds Wall time of the profiled run.",
+            'sros_run_seconds{{script="{}"}} {}'.format(script,
+                                                        summary["wall"]),
+        ]
+        for family, entries, labels in (
+            ("sros_phase", summary["phases"], ("phase",)),
+            ("sros_xpath", summary["xpaths"], ("phase", "xpath")),
+        ):
+            for counter, field, description in (
+                ("calls", "calls", "Calls"),
+                ("seconds", "seconds", "Seconds spent"),
+                ("received_bytes", "received",
+                 "Bytes of NETCONF replies received"),
+            ):
+                name = family + "_" + counter
+                lines.append("# TYPE {} counter".format(name))
+                lines.append("# HELP {} {} per {}.".format(
+                    name, description, " and ".join(labels)))
+                for entry in entries:
+                    values = ",".join(
+                        '{}="{}"'.format(label, _label_value(entry[label]))
+                        for label in labels)
+                    lines.append('{}_total{{script="{}",{}}} {}'.format(
+                        name, script, values, entry[field]))
+        lines.append("# EOF")
+        return "\n".join(lines) + "\n"
+
+    def write(self):
+        """Write the report and the OpenMetrics output if requested."""
+        if not self.enabled:
+            return
+        summary = self.summary()
+        if self.output_format == "json":
+            report = json.dumps(summary, indent=2) + "\n"
+        else:
+            report = self.format_table(summary)
+
+        if self.output_file:
+            with open(self.output_file, "w") as f:
+                f.write(report)
+        else:
+            sys.stderr.write(report)
+            sys.stderr.flush()
+
+        if self.metrics_file:
+            # written next to the target and renamed, as collectors may
+            # read the file at any time
+            tmpfile = self.metrics_file + ".tmp"
+            with open(tmpfile, "w") as f:
+                f.write(self.format_openmetrics(summary))
+            os.replace(tmpfile, self.metrics_file)
+
+
+def _label_value(value):
+    return (str(value).replace("\\", "\\\\").replace('"', '\\"')
+            .replace("\n", "\\n"))
+
+
+PROFILER = Profiler()
+
+
+def enable(requested=False, script=None):
+    """
+    Enable the default profiler if requested or set in the environment.
+
+    :parameter requested: the --profile option of the script was given
+    :type requested: bool
+    :parameter script: name of the script used in the report
+    :type script: str
+    :returns: whether profiling is enabled
+    :rtype: bool
+    """
+    setting = os.environ.get("SROS_PROFILE", "")
+    if not requested and not setting:
+        return PROFILER.enabled
+    if script:
+        PROFILER.script = script
+    PROFILER.enable(
+        output_format=setting if setting in FORMATS else "table",
+        output_file=os.environ.get("SROS_PROFILE_FILE") or None,
+        metrics_file=os.environ.get("SROS_PROFILE_METRICS") or None,
+    )
+    return True
+
+
+def phase(name, xpath=None):
+    """Account the time of a block to a phase of the default profiler."""
+    return PROFILER.phase(name, xpath)
+
+
+def iterate(iterable, name):
+    """Account the items of an iterable to a phase of the default profiler."""
+    return PROFILER.iterate(iterable, name)
+
+
+def instrument(connection_object):
+    """Instrument a Connection object for the default profiler."""
+    return PROFILER.instrument(connection_object)
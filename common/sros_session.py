@@ -0,0 +1,444 @@
+#!/usr/bin/env python3
+
+"""
+Shared NETCONF session handling for the pySROS scripts of this repo.
+
+Opening a session (SSH setup plus YANG schema loading) is the most
+expensive part of a small query. This module keeps sessions in a pool
+keyed by host, port and username so they are reused across calls,
+closes sessions that stayed idle for too long and caps the number of
+simultaneously open sessions.
+
+Copy this file next to a script when the script is copied on its own,
+e.g. to an SR OS node or into a GitLab repository.
+"""
+
+import os
+import sys
+import time
+from contextlib import contextmanager
+from pysros.management import connect
+
+try:
+    import threading
+except ImportError:
+    # the SR OS on-box interpreter may come without threading
+    threading = None
+
+try:
+    import atexit
+except ImportError:
+    atexit = None
+
+
+class _Unprofiled:
+    """
+    No-op stand-in for sros_profile.py, which is optional.
+
+    The scripts import sros_profile from this module, so they run
+    unchanged without it.
+    """
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+    def phase(self, name, xpath=None):
+        return self
+
+    def iterate(self, iterable, name):
+        return iterable
+
+    def instrument(self, connection_object):
+        return connection_object
+
+    def enable(self, requested=False, script=None):
+        if requested:
+            sys.stderr.write(
+                "sros_profile.py not found, --profile is ignored\n")
+        return False
+
+
+try:
+    import sros_profile
+except ImportError:
+    # profiling is optional, see sros_profile.py
+    sros_profile = _Unprofiled()
+
+
+_fake_connect = None
+
+
+def _fake_connect_function():
+    """
+    The connect function of sros_fake.py if SROS_FAKE is set.
+
+    This allows to run every script against the offline stand-in
+    without changing it, e.g. for load tests and benchmarks.
+    """
+    global _fake_connect
+    spec = os.environ.get("SROS_FAKE")
+    if not spec:
+        return None
+    if _fake_connect is None:
+        import sros_fake
+        _fake_connect = sros_fake.connect_function(spec)
+    return _fake_connect
+
+
+class _NoLock:
+    """Stand-in for threading.Condition when running single threaded."""
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+    def wait(self, timeout=None):
+        raise RuntimeError("session pool exhausted")
+
+    def notify_all(self):
+        pass
+
+
+class ConnectionPool:
+    """
+    Pool of pySROS Connection objects keyed by host.
+
+    :parameter max_sessions: maximum number of open sessions
+    :type max_sessions: int
+    :parameter idle_timeout: seconds after which an idle session is closed
+    :type idle_timeout: float
+    :parameter wait_timeout: seconds to wait for a free session when the
+                             pool is exhausted
+    :type wait_timeout: float
+    :parameter connect_function: function opening a new session, by
+                                 default :py:func:`pysros.management.connect`
+    :type connect_function: callable
+    """
+
+    def __init__(self, max_sessions=8, idle_timeout=300, wait_timeout=600,
+                 connect_function=None):
+        self.max_sessions = max(1, max_sessions)
+        self.idle_timeout = idle_timeout
+        self.wait_timeout = wait_timeout
+        self.connect_function = connect_function
+        self._idle = {}
+        self._busy = {}
+        self._condition = threading.Condition() if threading else _NoLock()
+
+    def _open(self, kwargs):
+        connect_function = (self.connect_function
+                            or _fake_connect_function() or connect)
+        with sros_profile.phase("connect"):
+            connection_object = connect_function(**kwargs)
+        return sros_profile.instrument(connection_object)
+
+    def _close(self, connection_object):
+        try:
+            connection_object.disconnect()
+        except Exception:
+            pass
+
+    def _count(self):
+        idle = sum(len(sessions) for sessions in self._idle.values())
+        return idle + len(self._busy)
+
+    def _pop_evictable(self, now):
+        """Idle sessions past idle_timeout, call with the lock held."""
+        expired = []
+        for key in list(self._idle):
+            keep = []
+            for connection_object, since in self._idle[key]:
+                if now - since > self.idle_timeout:
+                    expired.append(connection_object)
+                else:
+                    keep.append((connection_object, since))
+            if keep:
+                self._idle[key] = keep
+            else:
+                del self._idle[key]
+        return expired
+
+    def _pop_oldest_idle(self):
+        oldest = None
+        for key, sessions in self._idle.items():
+            if sessions and (oldest is None or sessions[0][1] < oldest[1]):
+                oldest = (key, sessions[0][1])
+        if oldest is None:
+            return None
+        connection_object = self._idle[oldest[0]].pop(0)[0]
+        if not self._idle[oldest[0]]:
+            del self._idle[oldest[0]]
+        return connection_object
+
+    def acquire(self, host=None, username=None, password=None, port=830,
+                **kwargs):
+        """
+        Obtain a Connection object to a specific SR OS device.
+
+        An idle session to the same host, port and username is reused,
+        otherwise a new session is opened. If the pool is exhausted the
+        oldest idle session of another host is closed, or the call waits
+        until a session is released.
+
+        :parameter host: The hostname or IP address of the SR OS node.
+        :type host: str
+        :parameter port: The TCP port for the connection to the SR OS node.
+        :type port: int
+        :returns: Connection object for the SR OS node.
+        :rtype: :py:class:`pysros.management.Connection`
+        :raises RuntimeError: Error if the connection could not be
+                              established or no session became free.
+        """
+        key = (host, port, username)
+        deadline = time.monotonic() + self.wait_timeout
+        to_close = []
+
+        with self._condition:
+            while True:
+                to_close.extend(self._pop_evictable(time.monotonic()))
+                if self._idle.get(key):
+                    connection_object = self._idle[key].pop()[0]
+                    if not self._idle[key]:
+                        del self._idle[key]
+                    self._busy[id(connection_object)] = (
+                        key, connection_object)
+                    break
+                if self._count() >= self.max_sessions:
+                    victim = self._pop_oldest_idle()
+                    if victim is not None:
+                        to_close.append(victim)
+                if self._count() < self.max_sessions:
+                    # reserve the slot while connecting outside the lock
+                    connection_object = None
+                    reservation = object()
+                    self._busy[id(reservation)] = (key, None)
+                    break
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise RuntimeError("no free session within "
+                                       + str(self.wait_timeout) + "s")
+                self._condition.wait(remaining)
+
+        for victim in to_close:
+            self._close(victim)
+
+        if connection_object is not None:
+            return connection_object
+
+        try:
+            connection_object = self._open(dict(kwargs, host=host,
+                                                username=username,
+                                                password=password,
+                                                port=port))
+        except BaseException:
+            with self._condition:
+                del self._busy[id(reservation)]
+                self._condition.notify_all()
+            raise
+
+        with self._condition:
+            del self._busy[id(reservation)]
+            self._busy[id(connection_object)] = (key, connection_object)
+        return connection_object
+
+    def release(self, connection_object, discard=False):
+        """
+        Return a Connection object to the pool.
+
+        :parameter discard: close the session instead of keeping it for
+                            reuse, e.g. after a failed request
+        :type discard: bool
+        """
+        with self._condition:
+            key, _ = self._busy.pop(id(connection_object), (None, None))
+            if key is not None and not discard:
+                self._idle.setdefault(key, []).append(
+                    (connection_object, time.monotonic()))
+            self._condition.notify_all()
+
+        if key is None or discard:
+            self._close(connection_object)
+
+    @contextmanager
+    def session(self, host=None, username=None, password=None, port=830,
+                **kwargs):
+        """
+        Context manager acquiring a Connection object from the pool.
+
+        The session is returned to the pool on exit, or closed if the
+        block raised an exception.
+        """
+        connection_object = self.acquire(host=host, username=username,
+                                         password=password, port=port,
+                                         **kwargs)
+        try:
+            yield connection_object
+        except BaseException:
+            self.release(connection_object, discard=True)
+            raise
+        self.release(connection_object)
+
+    def evict_idle(self):
+        """Close all sessions that stayed idle longer than idle_timeout."""
+        with self._condition:
+            expired = self._pop_evictable(time.monotonic())
+        for connection_object in expired:
+            self._close(connection_object)
+
+    def close(self):
+        """Close all idle sessions. Busy sessions are closed on release."""
+        with self._condition:
+            idle = [connection_object for sessions in self._idle.values()
+                    for connection_object, _ in sessions]
+            self._idle.clear()
+            self._condition.notify_all()
+        for connection_object in idle:
+            self._close(connection_object)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+        return False
+
+
+_default_pool = None
+
+
+def default_pool():
+    """
+    The process-wide pool shared by all callers of get_connection().
+
+    :rtype: ConnectionPool
+    """
+    global _default_pool
+    if _default_pool is None:
+        _default_pool = ConnectionPool()
+        if atexit:
+            atexit.register(_default_pool.close)
+    return _default_pool
+
+
+def get_connection(host=None, username=None, password=None, port=830,
+                   **kwargs):
+    """
+    Function definition to obtain a Connection object to a specific
+    SR OS device and access the model-driven information.
+
+    This function also checks whether the script is being executed
+    locally on a pySROS capable SROS device or on a remote machine.
+
+    The session is taken from the default pool and reused by later
+    calls for the same host once it is handed back with release().
+
+    :parameter host: The hostname or IP address of the SR OS node.
+    :type host: str
+    :paramater credentials: The username and password to connect
+                            to the SR OS node.
+    :type credentials: dict
+    :parameter port: The TCP port for the connection to the SR OS node.
+    :type port: int
+    :returns: Connection object for the SR OS node.
+    :rtype: :py:class:`pysros.management.Connection`
+    """
+    try:
+        connection_object = default_pool().acquire(
+            host=host,
+            username=username,
+            password=password,
+            port=port,
+            **kwargs
+        )
+    except RuntimeError as error1:
+        print("Failed to connect.  Error:", error1)
+        sys.exit(-1)
+    return connection_object
+
+
+def release(connection_object, discard=False):
+    """Return a Connection object obtained by get_connection() to the pool."""
+    default_pool().release(connection_object, discard)
+
+
+@contextmanager
+def session(host=None, username=None, password=None, port=830, **kwargs):
+    """
+    Context manager around get_connection() and release().
+
+    Like get_connection() the script is terminated if the connection
+    cannot be established.
+    """
+    connection_object = get_connection(host=host, username=username,
+                                       password=password, port=port, **kwargs)
+    try:
+        yield connection_object
+    except BaseException:
+        release(connection_object, discard=True)
+        raise
+    release(connection_object)
+
+
+def get_many(paths, workers=4, host=None, username=None, password=None,
+             port=830, **kwargs):
+    """
+    Retrieve several independent paths concurrently.
+
+    Every worker thread takes its own session from the default pool, as
+    a Connection object must not be shared between threads, so the total
+    time is that of the slowest request rather than the sum of all. The
+    paths are retrieved one after the other over a single session when
+    threading is not available.
+
+    :parameter paths: paths to retrieve, by name
+    :type paths: dict
+    :parameter workers: maximum number of concurrent sessions
+    :type workers: int
+    :returns: the retrieved pySROS data structures, by name
+    :rtype: dict
+    :raises Exception: the first error of any request
+    """
+    connect_kwargs = dict(kwargs, host=host, username=username,
+                          password=password, port=port)
+    names = list(paths)
+    results = {}
+
+    if threading is None or workers <= 1 or len(names) <= 1:
+        with session(**connect_kwargs) as connection_object:
+            for name in names:
+                results[name] = connection_object.running.get(paths[name])
+        return results
+
+    lock = threading.Lock()
+    pending = list(reversed(names))
+    errors = []
+
+    def worker():
+        try:
+            with session(**connect_kwargs) as connection_object:
+                while True:
+                    with lock:
+                        if not pending or errors:
+                            return
+                        name = pending.pop()
+                    results[name] = connection_object.running.get(paths[name])
+        except BaseException as error:
+            # includes the SystemExit of a failed connect
+            with lock:
+                errors.append(error)
+
+    threads = [threading.Thread(target=worker)
+               for _ in range(min(workers, len(names)))]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    if errors:
+        raise errors[0]
+    return results
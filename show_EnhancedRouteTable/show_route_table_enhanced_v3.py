@@ -9,45 +9,94 @@ Enhancement of SROS embedded show router [Id] route-table command.
 Tested on: SR OS 22.5.R1
 """
 
+import json
+import os
 import sys
+import time
 from datetime import timedelta
-from pysros.management import connect
+from itertools import chain, islice
+from pysros.management import sros
 from pysros.pprint import Table
 
+try:
+    import csv
+except ImportError:
+    # not every SR OS Python interpreter provides csv
+    csv = None
 
-def get_connection(host=None, username=None, password=None, port=830):
-    """
-    Function definition to obtain a Connection object to a specific
-    SR OS device and access the model-driven information.
+try:
+    from sros_session import get_many, session, sros_profile
+except ImportError:
+    sys.path.insert(
+        0,
+        os.path.join(
+            os.path.dirname(os.path.abspath(__file__)), "..", "common"
+        ),
+    )
+    from sros_session import get_many, session, sros_profile
 
-    This function also checks whether the script is being executed
-    locally on a pySROS capable SROS device or on a remote machine.
+# Service ID to service name mappings are cached between invocations,
+# see get_state_path() for the location
+SERVICE_CACHE_NAME = ".sros_service_cache.json"
+SERVICE_CACHE_TTL = 3600
 
-    :parameter host: The hostname or IP address of the SR OS node.
-    :type host: str
-    :paramater credentials: The username and password to connect
-                            to the SR OS node.
-    :type credentials: dict
-    :parameter port: The TCP port for the connection to the SR OS node.
-    :type port: int
-    :returns: Connection object for the SR OS node.
-    :rtype: :py:class:`pysros.management.Connection`
-    """
-    try:
-        connection_object = connect(
-            host=host,
-            username=username,
-            password=password,
-            port=port,
-        )
-    except RuntimeError as error1:
-        print("Failed to connect.  Error:", error1)
-        sys.exit(-1)
-    return connection_object
+# Address families of the route tables, IPv6 routes of 6VPE services
+# are resolved over the same IPv4 tunnels
+FAMILIES = ("ipv4", "ipv6")
+FAMILY_NAMES = {"ipv4": "IPv4", "ipv6": "IPv6"}
+
+# Output formats, table is the SR OS style table
+FORMATS = ("table", "json", "csv", "ndjson")
+RECORD_FIELDS = (
+    "service",
+    "family",
+    "prefix",
+    "protocol",
+    "age",
+    "preference",
+    "next-hop",
+)
+
+# Snapshots of the resolved routes per node and service for --diff,
+# see get_state_path() for the location
+SNAPSHOT_DIR_NAME = ".sros_route_snapshots"
+
+# Markers of the --diff output
+CHANGE_NAMES = {"+": "added", "-": "removed", "~": "changed"}
+
+# Digits of the groups of an IPv6 address, see parse_address()
+HEX_DIGITS = "0123456789abcdefABCDEF"
 
 
-def print_route_table_v4(rows):
-    """Function Definition to print the SROS style table."""
+def print_route_table(
+    rows,
+    page_size=None,
+    title="Service Route Table",
+    service_column=False,
+    change_column=False,
+):
+    """Function Definition to print the SROS style table.
+
+    Rows are printed as they are produced, so a generator of rows
+    reaches the terminal row by row instead of after the whole table
+    has been resolved.
+
+    :parameter rows: Rows of the table
+    :type rows: iterable
+    :parameter page_size: Number of rows after which the user is asked
+                          to continue, all rows are printed if not set
+    :type page_size: int
+    :parameter title: Title of the table
+    :type title: str
+    :parameter service_column: Rows start with the service name
+    :type service_column: bool
+    :parameter change_column: Rows start with the change marker
+                              (after the service name), see
+                              iter_route_diff()
+    :type change_column: bool
+    :returns:   True if the user stopped the output.
+    :rtype: bool
+    """
 
     # Define the columns that will be used in the table.  Each list item
     # is a tuple of (column width, heading).
@@ -58,72 +107,417 @@ def print_route_table_v4(rows):
         (15, "Preference"),
         (80, "Next Hop"),
     ]
+    if change_column:
+        cols.insert(0, (8, "Change"))
+    if service_column:
+        cols.insert(0, (20, "Service"))
 
     # Initalize the Table object with the heading and columns.
-    table = Table("Service Route Table", cols)
+    table = Table(title, cols)
+
+    # Print the output row by row, pausing after every page
+    age_column = 2 + service_column + change_column
+    stopped = False
+    table.reset()
+    table.printHeader(title)
+    table.printColumnHeaders()
+    for count, row in enumerate(rows, 1):
+        # converting Age into human readable format
+        # consisting of "x day, hh:mm:ss"
+        # Removed routes have no age any more
+        if row[age_column] is None:
+            row[age_column] = ""
+        else:
+            row[age_column] = timedelta(seconds=row[age_column])
+        table.printRow(row)
+        if page_size and count % page_size == 0:
+            answer = input("-- More (" + str(count) + " routes), q to quit --")
+            if answer.strip().lower() == "q":
+                stopped = True
+                break
+    table.printFooter()
+    return stopped
+
+
+def route_record(row, change_column=False):
+    """Function definition to turn a row with service name into a record.
+
+    :parameter row: [service name, route, protocol, age in seconds,
+                    preference, next hop], with the change marker after
+                    the service name if change_column is set
+    :type row: list
+    :parameter change_column: The row holds a change marker
+    :type change_column: bool
+    :returns:   The route with named fields.
+    :rtype: dict
+    """
+
+    record = {"service": row[0]}
+    if change_column:
+        record["change"] = CHANGE_NAMES[row[1]]
+    route, protocol, age, preference, next_hop = row[1 + change_column:]
+    record.update(
+        {
+            "family": "ipv6" if ":" in route else "ipv4",
+            "prefix": route,
+            "protocol": protocol,
+            "age": age,
+            "preference": preference,
+            "next-hop": next_hop,
+        }
+    )
+    return record
+
+
+def write_routes(rows, output_format, stream=None, change_column=False):
+    """Function definition to write routes in a machine-readable format.
+
+    json writes a single array, csv a header and one line per route and
+    ndjson one JSON object per line. Every route is written as soon as
+    it is resolved, so the output of large route tables can be consumed
+    while the script is still running.
+
+    :parameter rows: Rows with service name, see route_record()
+    :type rows: iterable
+    :parameter output_format: json, csv or ndjson
+    :type output_format: str
+    :parameter stream: The output stream, sys.stdout by default
+    :type stream: file
+    :parameter change_column: The rows hold a change marker
+    :type change_column: bool
+    """
+
+    stream = stream or sys.stdout
+    records = (route_record(row, change_column) for row in rows)
+
+    if output_format == "csv":
+        fieldnames = list(RECORD_FIELDS)
+        if change_column:
+            fieldnames.insert(1, "change")
+        writer = csv.DictWriter(
+            stream, fieldnames=fieldnames, lineterminator="\n"
+        )
+        writer.writeheader()
+        for record in records:
+            writer.writerow(record)
+    elif output_format == "ndjson":
+        for record in records:
+            stream.write(json.dumps(record) + "\n")
+            stream.flush()
+    else:
+        separator = "[\n"
+        for record in records:
+            stream.write(separator + json.dumps(record))
+            separator = ",\n"
+        stream.write("[]\n" if separator == "[\n" else "\n]\n")
+    stream.flush()
+
+
+def get_environment(name, default=None):
+    """Function definition to read an environment variable.
+
+    The SR OS on-box interpreter has no environment.
+
+    :parameter name: Name of the variable
+    :type name: str
+    :returns:   The value, default if the variable is not set.
+    :rtype: str
+    """
+
+    environ = getattr(os, "environ", None)
+    if environ is None:
+        return default
+    return environ.get(name) or default
+
+
+def get_state_path(variable, name):
+    """Function definition to locate a file kept between invocations.
 
-    # Print the output passing the data for the rows as
-    # an argument to the function.
-    table.print(rows)
+    The environment variable overrides the location. Otherwise the
+    file is kept in the home directory, or on cf3: when running on-box
+    where there is no home directory.
+
+    :parameter variable: Environment variable holding the location
+    :type variable: str
+    :parameter name: File name in the default location
+    :type name: str
+    :returns:   The path, None if there is no location to use.
+    :rtype: str
+    """
+
+    path = get_environment(variable)
+    if path:
+        return path
+    if sros():
+        return "cf3:/" + name
+    try:
+        home = os.path.expanduser("~")
+    except (AttributeError, KeyError):
+        return None
+    if not home or home == "~":
+        return None
+    return os.path.join(home, name)
+
+
+def get_node_key(host):
+    """Function definition to name the node of a session in the caches.
+
+    :parameter host: The host the session was opened to, None for the
+                     local node
+    :type host: str
+    :rtype: str
+    """
+
+    return host or "localhost"
+
+
+def load_service_cache(host=None, cache_file=None, ttl=None):
+    """Function definition to read the service ID to name cache.
+
+    The mappings are kept per node, as service IDs are only unique
+    within a node.
+
+    :parameter host: The host of the session, see get_node_key()
+    :type host: str
+    :parameter cache_file: Path of the cache file, see get_state_path()
+                           by default
+    :type cache_file: str
+    :parameter ttl: Seconds after which the cache is not used any more
+    :type ttl: int
+    :returns:   Mapping of service ID (as str) to service name, empty if
+                the cache is missing, unreadable or expired.
+    :rtype: dict
+    """
+
+    cache_file = cache_file or get_state_path(
+        "SROS_SERVICE_CACHE", SERVICE_CACHE_NAME
+    )
+    if cache_file is None:
+        return {}
+    if ttl is None:
+        ttl = int(
+            get_environment("SROS_SERVICE_CACHE_TTL", SERVICE_CACHE_TTL)
+        )
+
+    try:
+        with open(cache_file) as f:
+            cache = json.load(f)["nodes"][get_node_key(host)]
+        if time.time() - cache["timestamp"] <= ttl:
+            return cache["services"]
+    except (OSError, ValueError, KeyError, TypeError):
+        pass
+    return {}
+
+
+def save_service_cache(services, host=None, cache_file=None):
+    """Function definition to write the service ID to name cache.
+
+    A cache which cannot be written is ignored, it only saves an RPC.
+
+    :parameter services: Mapping of service ID (as str) to service name
+    :type services: dict
+    :parameter host: The host of the session, see get_node_key()
+    :type host: str
+    :parameter cache_file: Path of the cache file, see get_state_path()
+                           by default
+    :type cache_file: str
+    """
+
+    cache_file = cache_file or get_state_path(
+        "SROS_SERVICE_CACHE", SERVICE_CACHE_NAME
+    )
+    if cache_file is None:
+        return
+
+    try:
+        with open(cache_file) as f:
+            nodes = json.load(f)["nodes"]
+        if not isinstance(nodes, dict):
+            nodes = {}
+    except (OSError, ValueError, KeyError, TypeError):
+        nodes = {}
+    nodes[get_node_key(host)] = {
+        "timestamp": time.time(),
+        "services": services,
+    }
+
+    try:
+        with open(cache_file, "w") as f:
+            json.dump({"nodes": nodes}, f)
+    except OSError:
+        pass
+
+
+def fetch_service_ids(connection_object):
+    """Function definition to retrieve the ID of every VPRN service.
+
+    Only the oper-service-id leaf is selected, so the size of the reply
+    does not grow with the state of the services.
+
+    :parameter connection_object: The connection object
+    :type connection_object: :py:class:`pysros.management.Connection`
+    :returns:   Mapping of service ID (as str) to service name.
+    :rtype: dict
+    """
+
+    vprn_services = connection_object.running.get(
+        "/state/service/vprn", filter={"oper-service-id": {}}
+    )
+    services = {}
+    for service in vprn_services.keys():
+        services[str(vprn_services[service]["oper-service-id"].data)] = service
+    return services
 
 
-def get_service_name(input_parameter, vprn_services):
+def get_service_name(connection_object, service, host=None):
     """Function definition to resolve the service name.
 
     The information collection is based on the service name.
     If the user provides the service ID as the input parameter
     instead, this function resolves the corresponsing
-    service name.
+    service name. Known IDs are answered from a local cache,
+    the service IDs are only retrieved from the NE on a cache miss.
 
-    :parameter input_parameter: accessing provided input values
-    :type input_parameter: dict
-    :parameter vprn_services: Contains all VPRN services of a NE.
-    :type vprn_services: dict
+    :parameter connection_object: The connection object
+    :type connection_object: :py:class:`pysros.management.Connection`
+    :parameter service: The service ID or service name given by the user
+    :type service: str
+    :parameter host: The host of the session, the cache is kept per node
+    :type host: str
     :returns:   The service name of the service.
     :rtype: str
     """
 
-    if input_parameter[1].isdigit():
-        service_id = input_parameter[1]
+    if not service.isdigit():
+        return service
 
-        for service in vprn_services.keys():
-            if int(vprn_services[service]["oper-service-id"].data) == int(
-                service_id
-            ):
-                service_name = service
+    service_id = str(int(service))
+    services = load_service_cache(host)
+    if service_id not in services:
+        services = fetch_service_ids(connection_object)
+        save_service_cache(services, host)
+
+    if service_id not in services:
+        print("Service ID", service_id, "is not a VPRN service")
+        sys.exit(-1)
+    return services[service_id]
+
+
+def get_service_names(connection_object, services, host=None):
+    """Function definition to resolve the services given by the user.
+
+    :parameter connection_object: The connection object
+    :type connection_object: :py:class:`pysros.management.Connection`
+    :parameter services: Service IDs or service names, or "all" for
+                         every VPRN service of the NE
+    :type services: list
+    :parameter host: The host of the session, the cache is kept per node
+    :type host: str
+    :returns:   The service names, ordered by service ID for "all".
+    :rtype: list
+    """
+
+    if services == ["all"]:
+        services_by_id = fetch_service_ids(connection_object)
+        save_service_cache(services_by_id, host)
+        return [services_by_id[key] for key in sorted(services_by_id, key=int)]
+
+    service_names = []
+    for service in services:
+        service_name = get_service_name(connection_object, service, host)
+        if service_name not in service_names:
+            service_names.append(service_name)
+    return service_names
 
-    else:
-        service_name = input_parameter[1]
-    return service_name
 
+def build_interface_index(interface_list):
+    """Function definition to index the interfaces by if-index.
 
-def get_local_itf_name(service_routes, route, interface_list):
+    :parameter interface_list: Contains all interfaces on a given L3 service
+    :type interface_list: dict
+    :returns:   Mapping of if-index to interface name.
+    :rtype: dict
+    """
+
+    interface_index = {}
+    for interface in interface_list.keys():
+        interface_index[interface_list[interface]["if-index"].data] = interface
+    return interface_index
+
+
+def get_local_itf_name(service_routes, route, interface_index):
     """Function definition to resolve local interface name.
 
     For local interfaces in the L3VPN/L3EVPN the respective
-    interface name is resolved.
+    interface name is resolved. Routes with several next-hops
+    list all their interfaces.
 
     :parameter service_routes: Contains all routes of a given L3 service
     :type service_routes: dict
     :parameter route: A specific route to be checked
     :type route: str
-    :parameter interface_list: Contains all interfaces on a given L3 service
-    :type interface_list: dict
+    :parameter interface_index: if-index to interface name,
+                                see build_interface_index()
+    :type interface_index: dict
     :returns:   The interface name.
     :rtype: str
     """
 
-    if_index = service_routes[route]["nexthop"][0]["if-index"].data
-
-    for interface in interface_list.keys():
-        if interface_list[interface]["if-index"].data == if_index:
-            next_hop_interface = interface
+    next_hops = service_routes[route]["nexthop"]
+    interfaces = []
+    for index in sorted(next_hops.keys()):
+        if_index = next_hops[index]["if-index"].data
+        # an interface which is not known (any more) is shown by if-index
+        interface = interface_index.get(if_index, "if-index:" + str(if_index))
+        if interface not in interfaces:
+            interfaces.append(interface)
 
-    next_hop = next_hop_interface + " (local interface)"
+    next_hop = ", ".join(interfaces) + " (local interface)"
     return next_hop
 
 
-def get_next_hop_tunnel(service_routes, route, lsp_list, tun_table):
+def build_tunnel_index(*tun_tables):
+    """Function definition to index the tunnel tables by TTM tunnel ID.
+
+    Built once per invocation so that every route resolves its tunnel
+    with a single lookup instead of scanning the whole tunnel table.
+    The TTM tunnel ID is unique across the IPv4 and IPv6 tunnel tables,
+    so both can be merged into one index.
+
+    :parameter tun_tables: Contain all tunnels of the NE, one table per
+                           address family
+    :type tun_tables: dict
+    :returns:   Mapping of TTM tunnel ID to tunnel protocol.
+    :rtype: dict
+    """
+
+    tunnel_index = {}
+    for tun_table in tun_tables:
+        for tunnel in tun_table.keys():
+            tunnel_index[tun_table[tunnel]["id"].data] = tun_table[tunnel][
+                "protocol"
+            ].data
+    return tunnel_index
+
+
+def build_lsp_index(lsp_list):
+    """Function definition to index the LSPs by TTM tunnel ID.
+
+    :parameter lsp_list: Contains all LSPs of the NE
+    :type lsp_list: dict
+    :returns:   Mapping of TTM tunnel ID to LSP name.
+    :rtype: dict
+    """
+
+    lsp_index = {}
+    for lsp in lsp_list.keys():
+        # LSPs which are down have no TTM tunnel ID
+        if "ttm-tunnel-id" in lsp_list[lsp].keys():
+            lsp_index.setdefault(lsp_list[lsp]["ttm-tunnel-id"].data, lsp)
+    return lsp_index
+
+
+def get_next_hop_tunnel(service_routes, route, lsp_index, tunnel_index):
     """Function definition to resolve tunnel names.
 
     For tunneled routes in the L3VPN/L3EVPN the respective
@@ -133,10 +527,11 @@ def get_next_hop_tunnel(service_routes, route, lsp_list, tun_table):
     :type service_routes: dict
     :parameter route: A specific route to be checked
     :type route: str
-    :parameter lsp_list: Contains all LSPs of the NE
-    :type lsp_list: dict
-    :parameter tun_table: Contains all tunnels of the NE
-    :type tun_table: dict
+    :parameter lsp_index: TTM tunnel ID to LSP name, see build_lsp_index()
+    :type lsp_index: dict
+    :parameter tunnel_index: TTM tunnel ID to tunnel protocol,
+                             see build_tunnel_index()
+    :type tunnel_index: dict
     :returns:   The tunnel name.
     :rtype: str
     """
@@ -148,29 +543,22 @@ def get_next_hop_tunnel(service_routes, route, lsp_list, tun_table):
     # tun_id is set to empty string to avoid errors
     else:
         tun_id = ""
-    tun_type = next_hop_path["nexthop-tunnel-type"].data
-    for tunnel in tun_table.keys():
-        if tun_table[tunnel]["id"].data == tun_id:
-            next_hop_ip = tunnel[0]
-            next_hop_tun_proto = tun_table[tunnel]["protocol"].data
-        else:
-            next_hop_ip = next_hop_path["nexthop-ip"].data
-            next_hop_tun_proto = tun_type
-    for lsp in lsp_list.keys():
-        if lsp_list[lsp]["ttm-tunnel-id"].data == tun_id:
-            next_hop_lsp = " | lsp:" + lsp
-            break
-            # if an LSP with given Tunnel ID is found we break
-            # the for loop
-            # otherwise it would loop through all LSPs and the else
-            # condition at the end would most likely be met
-        # handling case in which Tunnel ID does not exist
-        if tun_id == "":
-            next_hop_lsp = ""
-        # handling case in which LSP Name is not resolvable
-        # in that case TTM Tunnel ID is displayed
-        else:
-            next_hop_lsp = " | ttmId:" + str(tun_id)
+    next_hop_ip = next_hop_path["nexthop-ip"].data
+    # the protocol of the tunnel table is more specific than the
+    # tunnel type of the route
+    next_hop_tun_proto = tunnel_index.get(
+        tun_id, next_hop_path["nexthop-tunnel-type"].data
+    )
+
+    if tun_id in lsp_index:
+        next_hop_lsp = " | lsp:" + lsp_index[tun_id]
+    # handling case in which Tunnel ID does not exist
+    elif tun_id == "":
+        next_hop_lsp = ""
+    # handling case in which LSP Name is not resolvable
+    # in that case TTM Tunnel ID is displayed
+    else:
+        next_hop_lsp = " | ttmId:" + str(tun_id)
     next_hop = (
         next_hop_ip
         + " "
@@ -182,92 +570,954 @@ def get_next_hop_tunnel(service_routes, route, lsp_list, tun_table):
     return next_hop
 
 
-def get_data():
+def iter_service_data(service_names, families=("ipv4",), workers=4):
     """
-    Dedicated function to retrieve required data.
+    Generator retrieving the required data service by service.
 
-    :returns:   A tuple holding the required data.
-    :rtype: tuple
+    The Base tunnel tables and LSPs are retrieved only once, together
+    with the data of the first services, and are shared by all services.
+    The route tables of all families and the interfaces of up to workers
+    services are retrieved concurrently over separate sessions, so only
+    that many services are held in memory at a time.
+
+    :parameter service_names: The service names
+    :type service_names: list
+    :parameter families: Address families of the route tables
+    :type families: tuple
+    :parameter workers: Number of concurrent sessions
+    :type workers: int
+    :returns:   Tuples of the service name and the required data, see
+                get_service_paths() and get_shared_paths().
+    :rtype: generator
     """
 
-    # Calling the get_connection() function to establish
-    # the connection to the NE.
-    connection_object = get_connection()
+    shared_data = None
+    for start in range(0, len(service_names), workers):
+        batch = service_names[start:start + workers]
+        paths = {}
+        for service_name in batch:
+            service_paths = get_service_paths(service_name, families)
+            for name, path in service_paths.items():
+                paths[(service_name, name)] = path
+        if shared_data is None:
+            paths.update(get_shared_paths(families))
 
-    # List of VPRN services is needed to resolve service Id
-    # to service name
-    vprn_services = connection_object.running.get("/state/service/vprn")
-    service_name = get_service_name(sys.argv, vprn_services)
+        # the requests are accounted by the worker threads, this is the
+        # time the caller waits for them
+        with sros_profile.phase("fetch"):
+            data = get_many(paths, workers=workers)
 
+        if shared_data is None:
+            shared_data = dict(
+                (name, data[name]) for name in get_shared_paths(families)
+            )
+        for service_name in batch:
+            service_data = dict(shared_data)
+            for name in get_service_paths(service_name, families):
+                service_data[name] = data[(service_name, name)]
+            yield service_name, service_data
+
+
+def get_service_paths(service_name, families=("ipv4",)):
+    """
+    Paths of the per service data required to resolve its routes.
+
+    :parameter service_name: The service name
+    :type service_name: str
+    :parameter families: Address families of the route tables
+    :type families: tuple
+    :returns:   The paths by name, the route tables are named
+                routes_ipv4 and routes_ipv6.
+    :rtype: dict
+    """
+
+    service_path = "/state/service/vprn[service-name=" + service_name + "]"
+    paths = {
+        # All interfaces for a given are retrieved
+        # Needed to resolve the interface name
+        "interface_list": service_path + "/interface",
+    }
     # All routes for a given service are retrieved
-    path_service_routes = (
-        "/state/service/vprn[service-name="
-        + service_name
-        + "]/route-table/unicast/ipv4/route"
-    )
-    service_routes = connection_object.running.get(path_service_routes)
+    for family in families:
+        paths["routes_" + family] = (
+            service_path + "/route-table/unicast/" + family + "/route"
+        )
+    return paths
 
-    # All interfaces for a given are retrieved
-    # Needed to resolve the interface name
-    path_interface_list = (
-        "/state/service/vprn[service-name=" + service_name + "]/interface"
-    )
-    interface_list = connection_object.running.get(path_interface_list)
 
-    # Tunnel Table and LSP List are retrieved
-    # Together they allow tunneled route resolution from TTM Id to tunnel name
-    tun_table = connection_object.running.get(
-        "/state/router[router-name=Base]/tunnel-table/ipv4/tunnel"
-    )
-    lsp_list = connection_object.running.get(
-        "/state/router[router-name=Base]/mpls/lsp"
-    )
+def get_shared_paths(families=("ipv4",)):
+    """
+    Paths of the data shared by all services.
 
-    # Returning all needed data back to the main() function
-    return service_routes, interface_list, tun_table, lsp_list
+    Tunnel Table and LSP List are retrieved once for all services.
+    Together they allow tunneled route resolution from TTM Id to
+    tunnel name. The IPv4 tunnel table is always needed, IPv6 routes
+    may be resolved over either.
 
+    :parameter families: Address families of the route tables
+    :type families: tuple
+    :returns:   The paths by name, the tunnel tables are named
+                tunnels_ipv4 and tunnels_ipv6.
+    :rtype: dict
+    """
 
-def main():
+    paths = {"lsp_list": "/state/router[router-name=Base]/mpls/lsp"}
+    for family in FAMILIES:
+        if family == "ipv4" or family in families:
+            paths["tunnels_" + family] = (
+                "/state/router[router-name=Base]/tunnel-table/"
+                + family
+                + "/tunnel"
+            )
+    return paths
+
+
+def parse_address(address):
+    """Function definition to turn an IPv4 or IPv6 address into a number.
+
+    ipaddress is not available in every SR OS Python interpreter,
+    so the addresses are parsed by hand.
+
+    :parameter address: The address without prefix length
+    :type address: str
+    :returns:   The number of bits of the address family and the
+                address as integer.
+    :rtype: tuple
+    :raises ValueError: if the address is invalid
     """
-    Main procedure to get all L3VPN/L3EVPN routes for a given service.
 
-    It takes the input service ID or service name and collects required
-    information from the SROS device to list all L3VPN/L3EVPN routes and
-    resolve tunneled routes in an SROS style table
+    if ":" not in address:
+        octets = address.split(".")
+        if len(octets) != 4:
+            raise ValueError("invalid IPv4 address " + repr(address))
+        value = 0
+        for octet in octets:
+            if not octet.isdigit() or int(octet) > 255:
+                raise ValueError("invalid IPv4 address " + repr(address))
+            value = value << 8 | int(octet)
+        return 32, value
+
+    def get_groups(text):
+        if not text:
+            return []
+        parts = text.split(":")
+        groups = parts[:-1]
+        if "." in parts[-1]:
+            # IPv4 address in the last 32 bits, e.g. ::ffff:10.0.0.1
+            _, value = parse_address(parts[-1])
+            groups += [
+                "{:x}".format(value >> 16),
+                "{:x}".format(value & 0xFFFF),
+            ]
+        else:
+            groups.append(parts[-1])
+        for group in groups:
+            if not 0 < len(group) <= 4 or group.strip(HEX_DIGITS):
+                raise ValueError("invalid IPv6 address " + repr(address))
+        return [int(group, 16) for group in groups]
+
+    head, compressed, tail = address.partition("::")
+    if "::" in tail:
+        raise ValueError("invalid IPv6 address " + repr(address))
+    groups = get_groups(head)
+    tail_groups = get_groups(tail)
+    if compressed:
+        missing = 8 - len(groups) - len(tail_groups)
+        if missing < 1:
+            raise ValueError("invalid IPv6 address " + repr(address))
+        groups += [0] * missing
+    groups += tail_groups
+    if len(groups) != 8:
+        raise ValueError("invalid IPv6 address " + repr(address))
+    value = 0
+    for group in groups:
+        value = value << 16 | group
+    return 128, value
+
+
+def parse_prefix(prefix):
+    """Function definition to split a prefix into its network and length.
+
+    An address without length is taken as host prefix, host bits set
+    within the length are ignored.
+
+    :parameter prefix: The prefix, e.g. 10.0.0.0/16 or 2001:db8::/32
+    :type prefix: str
+    :returns:   The number of bits of the address family, the prefix
+                length and the network bits, i.e. the address shifted
+                right by the host bits.
+    :rtype: tuple
+    :raises ValueError: if the prefix is invalid
     """
 
-    (
-        service_routes,
-        interface_list,
-        tun_table,
-        lsp_list,
-    ) = get_data()
+    address, slash, length = prefix.partition("/")
+    bits, value = parse_address(address)
+    if not slash:
+        return bits, bits, value
+    if not length.isdigit() or int(length) > bits:
+        raise ValueError("invalid prefix length " + repr(prefix))
+    length = int(length)
+    return bits, length, value >> (bits - length)
+
 
-    svc_route_table_v4 = []
+def get_prefix_filter(prefix):
+    """Function definition to build the check of the --prefix option.
 
+    A route matches if its destination prefix lies within the given
+    prefix, e.g. 10.0.0.0/16 matches 10.0.1.0/24 and 10.0.0.0/16 but
+    neither 10.0.0.0/8 nor 10.1.0.0/24.
+
+    :parameter prefix: The prefix given by the user, None for all routes
+    :type prefix: str
+    :returns:   A function telling whether a route matches, None if
+                every route matches.
+    :rtype: function
+    """
+
+    if not prefix:
+        return None
+    bits, length, network = parse_prefix(prefix)
+
+    def contains(route):
+        try:
+            route_bits, route_length, route_network = parse_prefix(route)
+        except ValueError:
+            return False
+        return (
+            route_bits == bits
+            and route_length >= length
+            and route_network >> (route_length - length) == network
+        )
+
+    return contains
+
+
+def iter_route_rows(
+    service_routes,
+    interface_index,
+    lsp_index,
+    tunnel_index,
+    prefix=None,
+    limit=None,
+):
+    """Generator resolving the routes of a service into table rows.
+
+    Each route is resolved only when its row is requested, so rows can
+    be printed while later routes are still being resolved.
+
+    :parameter service_routes: Contains all routes of a given L3 service
+    :type service_routes: dict
+    :parameter interface_index: see build_interface_index()
+    :type interface_index: dict
+    :parameter lsp_index: see build_lsp_index()
+    :type lsp_index: dict
+    :parameter tunnel_index: see build_tunnel_index()
+    :type tunnel_index: dict
+    :parameter prefix: Only routes within this prefix are returned,
+                       see get_prefix_filter()
+    :type prefix: str
+    :parameter limit: Maximum number of rows
+    :type limit: int
+    :returns:   Rows of [route, protocol, age in seconds, preference,
+                next hop].
+    :rtype: generator
+    """
+
+    contains = get_prefix_filter(prefix)
+    count = 0
     for route in service_routes.keys():
+        if contains and not contains(route):
+            continue
+        if limit is not None and count >= limit:
+            return
+        count += 1
 
         protocol = service_routes[route]["protocol"].data
-        # converting Age into human readable format
-        # consisting of "x day, hh:mm:ss"
-        age = timedelta(seconds=service_routes[route]["age"].data)
+        # Age is kept in seconds, the table output converts it
+        age = service_routes[route]["age"].data
         preference = service_routes[route]["preference"].data
 
         # This block does interface name resolution based
         # on if-index from route output
         if protocol == "local":
             next_hop = get_local_itf_name(
-                service_routes, route, interface_list
+                service_routes, route, interface_index
             )
         # The function call below handles tunnel name resolution
         else:
             next_hop = get_next_hop_tunnel(
-                service_routes, route, lsp_list, tun_table
+                service_routes, route, lsp_index, tunnel_index
+            )
+
+        yield [route, protocol, age, preference, next_hop]
+
+
+def get_node_name(connection_object):
+    """Function definition to retrieve the name of the NE.
+
+    :parameter connection_object: The connection object
+    :type connection_object: :py:class:`pysros.management.Connection`
+    :returns:   The system name.
+    :rtype: str
+    """
+
+    return str(connection_object.running.get("/state/system/oper-name").data)
+
+
+def get_snapshot_file(node_name, service_name, family):
+    """Function definition to locate the snapshot of a route table.
+
+    :returns:   Path of the snapshot file, None if there is no location
+                to keep snapshots.
+    :rtype: str
+    """
+
+    snapshot_dir = get_state_path("SROS_ROUTE_SNAPSHOTS", SNAPSHOT_DIR_NAME)
+    if snapshot_dir is None:
+        return None
+
+    def file_name(name):
+        return name.replace("/", "_").replace("\\", "_")
+
+    return "/".join(
+        [
+            snapshot_dir.rstrip("/"),
+            file_name(node_name),
+            file_name(service_name) + "." + family + ".json",
+        ]
+    )
+
+
+def make_directories(path):
+    """Function definition to create a directory and its parents.
+
+    :parameter path: The directory
+    :type path: str
+    """
+
+    if hasattr(os, "makedirs"):
+        os.makedirs(path, exist_ok=True)
+        return
+    # the on-box interpreter only provides os.mkdir
+    parent = path.rsplit("/", 1)[0]
+    if parent and parent != path and not parent.endswith(":"):
+        make_directories(parent)
+    try:
+        os.mkdir(path)
+    except OSError:
+        pass
+
+
+def load_snapshot(snapshot_file):
+    """Function definition to read a route table snapshot.
+
+    :parameter snapshot_file: Path of the snapshot file
+    :type snapshot_file: str
+    :returns:   The snapshot, without routes if there is none yet.
+    :rtype: dict
+    """
+
+    try:
+        with open(snapshot_file) as f:
+            return json.load(f)
+    except (OSError, ValueError, TypeError):
+        return {"generation": None, "routes": {}}
+
+
+def save_snapshot(snapshot_file, snapshot):
+    """Function definition to write a route table snapshot.
+
+    :parameter snapshot_file: Path of the snapshot file
+    :type snapshot_file: str
+    :parameter snapshot: The snapshot, see iter_route_diff()
+    :type snapshot: dict
+    """
+
+    if snapshot_file is None:
+        print("No location for snapshots, set SROS_ROUTE_SNAPSHOTS")
+        return
+    snapshot["timestamp"] = time.time()
+    try:
+        make_directories(snapshot_file.rsplit("/", 1)[0])
+        with open(snapshot_file + ".tmp", "w") as f:
+            json.dump(snapshot, f, separators=(",", ":"))
+        os.replace(snapshot_file + ".tmp", snapshot_file)
+    except OSError as error:
+        print("Failed to write snapshot", snapshot_file, "Error:", error)
+
+
+def get_index_generation(interface_index, lsp_index, tunnel_index):
+    """Function definition to fingerprint the resolution indexes.
+
+    Resolved next-hops of a snapshot can only be reused as long as the
+    interfaces, LSPs and tunnels they were resolved from are unchanged.
+
+    :returns:   A string that changes whenever one of the indexes changes.
+    :rtype: str
+    """
+
+    return json.dumps(
+        [
+            sorted(interface_index.items()),
+            sorted(lsp_index.items()),
+            sorted(tunnel_index.items()),
+        ]
+    )
+
+
+def get_route_fingerprint(route_data):
+    """Function definition to fingerprint the raw data of a route.
+
+    Only the leaves the resolution depends on are taken into account,
+    the age of a route changes with every run.
+
+    :parameter route_data: A route of the route table
+    :type route_data: :py:class:`pysros.wrappers.Container`
+    :returns:   A string that changes whenever the resolution may change.
+    :rtype: str
+    """
+
+    def leaf(container, name):
+        if name in container.keys():
+            return container[name].data
+        return None
+
+    fingerprint = [
+        leaf(route_data, "protocol"),
+        leaf(route_data, "preference"),
+    ]
+    next_hops = route_data["nexthop"] if "nexthop" in route_data.keys() else {}
+    for index in sorted(next_hops.keys()):
+        next_hop = next_hops[index]
+        fingerprint.append(leaf(next_hop, "if-index"))
+        if "resolving-nexthop" in next_hop.keys():
+            for resolving in sorted(next_hop["resolving-nexthop"].keys()):
+                resolving_next_hop = next_hop["resolving-nexthop"][resolving]
+                fingerprint.extend(
+                    leaf(resolving_next_hop, name)
+                    for name in (
+                        "nexthop-tunnel-id",
+                        "nexthop-tunnel-type",
+                        "nexthop-ip",
+                    )
+                )
+    return json.dumps(fingerprint)
+
+
+def diff_routes(
+    service_routes,
+    interface_index,
+    lsp_index,
+    tunnel_index,
+    previous,
+    prefix=None,
+    generation=None,
+):
+    """Function definition to compare a route table with a snapshot.
+
+    Only routes whose raw data changed since the snapshot are resolved
+    again, unless the interfaces, LSPs or tunnels changed as well.
+
+    :parameter service_routes: Contains all routes of a given L3 service
+    :type service_routes: dict
+    :parameter previous: The snapshot to compare with
+    :type previous: dict
+    :parameter prefix: Only routes within this prefix are returned,
+                       all routes are stored in the snapshot
+    :type prefix: str
+    :parameter generation: see get_index_generation(), computed from the
+                           indexes if not given
+    :type generation: str
+    :returns:   The changed rows of [change, route, protocol, age in
+                seconds, preference, next hop] where change is "+" for
+                added, "-" for removed and "~" for changed routes, and
+                the snapshot of the current routes.
+    :rtype: tuple
+    """
+
+    if generation is None:
+        generation = get_index_generation(
+            interface_index, lsp_index, tunnel_index
+        )
+    reusable = previous["generation"] == generation
+    previous_routes = previous["routes"]
+    contains = get_prefix_filter(prefix)
+
+    routes = {}
+    rows = []
+    for route in service_routes.keys():
+        fingerprint = get_route_fingerprint(service_routes[route])
+        old = previous_routes.get(route)
+
+        if reusable and old is not None and old[0] == fingerprint:
+            entry = old
+        else:
+            protocol = service_routes[route]["protocol"].data
+            if protocol == "local":
+                next_hop = get_local_itf_name(
+                    service_routes, route, interface_index
+                )
+            else:
+                next_hop = get_next_hop_tunnel(
+                    service_routes, route, lsp_index, tunnel_index
+                )
+            entry = [
+                fingerprint,
+                protocol,
+                service_routes[route]["preference"].data,
+                next_hop,
+            ]
+        routes[route] = entry
+
+        if contains and not contains(route):
+            continue
+        age = service_routes[route]["age"].data
+        if old is None:
+            rows.append(["+", route, entry[1], age, entry[2], entry[3]])
+        elif old[1:] != entry[1:]:
+            next_hop = entry[3]
+            if old[3] != entry[3]:
+                next_hop = old[3] + " -> " + entry[3]
+            rows.append(["~", route, entry[1], age, entry[2], next_hop])
+
+    for route, old in previous_routes.items():
+        if route not in routes and not (contains and not contains(route)):
+            rows.append(["-", route, old[1], None, old[2], old[3]])
+
+    return rows, {"generation": generation, "routes": routes}
+
+
+def iter_route_diff(
+    service_routes,
+    interface_index,
+    lsp_index,
+    tunnel_index,
+    snapshot_file,
+    prefix=None,
+):
+    """Generator of the routes changed since the last snapshot.
+
+    The snapshot file is replaced by the current routes before the
+    first row is returned, see diff_routes().
+
+    :parameter snapshot_file: Path of the snapshot file
+    :type snapshot_file: str
+    :returns:   Rows as returned by diff_routes().
+    :rtype: generator
+    """
+
+    rows, snapshot = diff_routes(
+        service_routes,
+        interface_index,
+        lsp_index,
+        tunnel_index,
+        load_snapshot(snapshot_file),
+        prefix=prefix,
+    )
+    save_snapshot(snapshot_file, snapshot)
+
+    for row in rows:
+        yield row
+
+
+def get_resolution_data(connection_object, service_names, families):
+    """Function definition to retrieve the data the indexes are built from.
+
+    Only the leaves needed for the indexes are selected, which keeps
+    the replies small enough to be polled by watch().
+
+    :parameter connection_object: The connection object
+    :type connection_object: :py:class:`pysros.management.Connection`
+    :parameter service_names: The service names
+    :type service_names: list
+    :parameter families: Address families of the route tables
+    :type families: tuple
+    :returns:   The tunnel and LSP indexes, and the interface index
+                per service.
+    :rtype: tuple
+    """
+
+    shared_paths = get_shared_paths(families)
+    lsp_list = connection_object.running.get(
+        shared_paths["lsp_list"], filter={"ttm-tunnel-id": {}}
+    )
+    tun_tables = [
+        connection_object.running.get(
+            shared_paths["tunnels_" + family],
+            filter={"id": {}, "protocol": {}},
+        )
+        for family in FAMILIES
+        if "tunnels_" + family in shared_paths
+    ]
+    interface_indexes = {}
+    for service_name in service_names:
+        interface_indexes[service_name] = build_interface_index(
+            connection_object.running.get(
+                get_service_paths(service_name)["interface_list"],
+                filter={"if-index": {}},
             )
+        )
+    return (
+        build_tunnel_index(*tun_tables),
+        build_lsp_index(lsp_list),
+        interface_indexes,
+    )
+
+
+def watch(options):
+    """Function definition to refresh the route tables periodically.
+
+    A single session is kept open. Every interval the tunnel, LSP and
+    interface IDs are polled with selection filters; the resolution
+    indexes are only rebuilt and routes only resolved again when these
+    changed. The route tables themselves are retrieved every interval,
+    but only the routes that changed since the previous interval are
+    printed. The loop is stopped with Ctrl-C.
+
+    :parameter options: The options given by the user
+    :type options: dict
+    """
+
+    interval = options["watch"]
+    snapshots = {}
+    generations = {}
+    indexes = None
+
+    with session() as connection_object:
+        service_names = get_service_names(
+            connection_object, options["services"]
+        )
+        try:
+            while True:
+                started = time.time()
+
+                with sros_profile.phase("index"):
+                    current = get_resolution_data(
+                        connection_object, service_names, options["families"]
+                    )
+                if current != indexes:
+                    indexes = current
+                    generations = {}
+                tunnel_index, lsp_index, interface_indexes = indexes
+
+                for service_name in service_names:
+                    interface_index = interface_indexes[service_name]
+                    if service_name not in generations:
+                        generations[service_name] = get_index_generation(
+                            interface_index, lsp_index, tunnel_index
+                        )
+                    paths = get_service_paths(
+                        service_name, options["families"]
+                    )
 
-        svc_route_table_v4.append([route, protocol, age, preference, next_hop])
+                    for family in options["families"]:
+                        key = (service_name, family)
+                        first = key not in snapshots
+                        with sros_profile.phase("resolve"):
+                            rows, snapshots[key] = diff_routes(
+                                connection_object.running.get(
+                                    paths["routes_" + family]
+                                ),
+                                interface_index,
+                                lsp_index,
+                                tunnel_index,
+                                snapshots.get(
+                                    key, {"generation": None, "routes": {}}
+                                ),
+                                prefix=options["prefix"],
+                                generation=generations[service_name],
+                            )
+                        if first or rows:
+                            with sros_profile.phase("output"):
+                                print_watch_rows(
+                                    rows, service_name, family, first, options
+                                )
 
-    print_route_table_v4(svc_route_table_v4)
+                time.sleep(max(0, interval - (time.time() - started)))
+        except KeyboardInterrupt:
+            pass
+
+
+def print_watch_rows(rows, service_name, family, first, options):
+    """Function definition to print one refresh of watch().
+
+    The first refresh shows the complete route table, later refreshes
+    only the changed routes.
+
+    :parameter rows: Rows as returned by diff_routes()
+    :type rows: list
+    :parameter service_name: The service name
+    :type service_name: str
+    :parameter family: The address family
+    :type family: str
+    :parameter first: This is the first refresh of the route table
+    :type first: bool
+    :parameter options: The options given by the user
+    :type options: dict
+    """
+
+    if first:
+        rows = [row[1:] for row in rows]
+    if options["limit"] is not None:
+        rows = rows[:options["limit"]]
+
+    if options["format"] != "table":
+        write_routes(
+            ([service_name] + row for row in rows),
+            options["format"],
+            change_column=not first,
+        )
+        return
+
+    title = "Service Route Table" if first else "Service Route Changes"
+    title += (
+        " (Service: "
+        + service_name
+        + ", "
+        + FAMILY_NAMES[family]
+        + ", "
+        + time.strftime("%H:%M:%S")
+        + ")"
+    )
+    print_route_table(rows, title=title, change_column=not first)
+
+
+def usage():
+    """Print the usage of the script and exit."""
+
+    print(
+        "Usage: show_route_table_enhanced_v3.py"
+        " <service-id|service-name>... | all"
+        " [--family ipv4|ipv6|dual] [--split-family]"
+        " [--prefix <prefix>] [--limit <n>] [--page <n>]"
+        " [--combined] [--workers <n>] [--format table|json|csv|ndjson]"
+        " [--diff | --watch <seconds>] [--profile]"
+    )
+    sys.exit(-1)
+
+
+def parse_arguments(argv):
+    """Function definition to parse the command line.
+
+    argparse is not available in every SR OS Python interpreter,
+    so the few options are parsed by hand.
+
+    :parameter argv: The command line, usually sys.argv
+    :type argv: list
+    :returns:   The options given by the user.
+    :rtype: dict
+    """
+
+    options = {
+        "services": [],
+        "families": ("ipv4",),
+        "split_family": False,
+        "prefix": None,
+        "limit": None,
+        "page": None,
+        "combined": False,
+        "workers": 4,
+        "format": "table",
+        "diff": False,
+        "watch": None,
+        "profile": False,
+    }
+    arguments = iter(argv[1:])
+    for argument in arguments:
+        if argument in (
+            "--prefix",
+            "--limit",
+            "--page",
+            "--workers",
+            "--family",
+            "--format",
+            "--watch",
+        ):
+            value = next(arguments, None)
+            if value is None:
+                usage()
+            if argument == "--prefix":
+                try:
+                    parse_prefix(value)
+                except ValueError:
+                    usage()
+                options["prefix"] = value
+            elif argument == "--format":
+                if value not in FORMATS:
+                    usage()
+                options["format"] = value
+            elif argument == "--family":
+                if value == "dual":
+                    options["families"] = FAMILIES
+                elif value in FAMILIES:
+                    options["families"] = (value,)
+                else:
+                    usage()
+            elif value.isdigit() and int(value) > 0:
+                options[argument[2:]] = int(value)
+            else:
+                usage()
+        elif argument in (
+            "--combined",
+            "--split-family",
+            "--diff",
+            "--profile",
+        ):
+            options[argument[2:].replace("-", "_")] = True
+        elif argument.startswith("-"):
+            usage()
+        else:
+            options["services"].append(argument)
+
+    if not options["services"] or (
+        "all" in options["services"] and len(options["services"]) > 1
+    ):
+        usage()
+    # watch mode writes a chunk per refresh, that only suits streams
+    if options["watch"] is not None and (
+        options["diff"] or options["format"] in ("json", "csv")
+    ):
+        usage()
+    if options["format"] == "csv" and csv is None:
+        print("The csv format is not supported by this Python interpreter")
+        sys.exit(-1)
+    # machine-readable formats carry the service in every record
+    if options["format"] != "table":
+        options["combined"] = True
+    return options
+
+
+def iter_service_rows(service_data, options):
+    """Generator resolving the routes of several services.
+
+    The tunnel and LSP indexes are built once, as all services and
+    address families share the same Base tunnel tables and LSPs.
+
+    :parameter service_data: Tuples as returned by iter_service_data()
+    :type service_data: iterable
+    :parameter options: The options given by the user
+    :type options: dict
+    :returns:   Tuples of the service name, the address family (None if
+                the families are not split) and the rows.
+    :rtype: generator
+    """
+
+    tunnel_index = lsp_index = None
+    for service_name, data in service_data:
+        # Resolution indexes are built once and shared by all routes
+        with sros_profile.phase("index"):
+            if tunnel_index is None:
+                tunnel_index = build_tunnel_index(
+                    *[data["tunnels_" + family] for family in FAMILIES
+                      if "tunnels_" + family in data]
+                )
+                lsp_index = build_lsp_index(data["lsp_list"])
+            interface_index = build_interface_index(data["interface_list"])
+
+        tables = []
+        for family in options["families"]:
+            if options["diff"]:
+                rows = iter_route_diff(
+                    data["routes_" + family],
+                    interface_index,
+                    lsp_index,
+                    tunnel_index,
+                    get_snapshot_file(options["node"], service_name, family),
+                    prefix=options["prefix"],
+                )
+            else:
+                rows = iter_route_rows(
+                    data["routes_" + family],
+                    interface_index,
+                    lsp_index,
+                    tunnel_index,
+                    prefix=options["prefix"],
+                )
+            tables.append((family, sros_profile.iterate(rows, "resolve")))
+        if not options["split_family"] and len(tables) > 1:
+            tables = [(None, chain(*[rows for _, rows in tables]))]
+
+        for family, rows in tables:
+            if options["limit"] is not None and not options["combined"]:
+                rows = islice(rows, options["limit"])
+            yield service_name, family, rows
+
+
+def main():
+    """
+    Main procedure to get all L3VPN/L3EVPN routes for the given services.
+
+    It takes the input service IDs or service names and collects required
+    information from the SROS device to list all L3VPN/L3EVPN routes and
+    resolve tunneled routes in an SROS style table, either one table per
+    service or one combined table.
+    """
+
+    options = parse_arguments(sys.argv)
+    sros_profile.enable(options["profile"])
+
+    if options["watch"] is not None:
+        watch(options)
+        return
+
+    with session() as connection_object:
+        service_names = get_service_names(
+            connection_object, options["services"]
+        )
+        if options["diff"]:
+            options["node"] = get_node_name(connection_object)
+
+    service_rows = iter_service_rows(
+        iter_service_data(
+            service_names, options["families"], workers=options["workers"]
+        ),
+        options,
+    )
+
+    if options["combined"]:
+        rows = (
+            [service_name] + row
+            for service_name, _, svc_route_table in service_rows
+            for row in svc_route_table
+        )
+        if options["limit"] is not None:
+            rows = islice(rows, options["limit"])
+        with sros_profile.phase("output"):
+            if options["format"] == "table":
+                print_route_table(
+                    rows,
+                    page_size=options["page"],
+                    service_column=True,
+                    change_column=options["diff"],
+                )
+            else:
+                write_routes(
+                    rows, options["format"], change_column=options["diff"]
+                )
+        return
+
+    for service_name, family, svc_route_table in service_rows:
+        qualifiers = []
+        if len(service_names) > 1:
+            qualifiers.append("Service: " + service_name)
+        if family is not None and (
+            options["split_family"] or family != "ipv4"
+        ):
+            qualifiers.append(FAMILY_NAMES[family])
+        title = "Service Route Table"
+        if options["diff"]:
+            title = "Service Route Changes"
+        if qualifiers:
+            title += " (" + ", ".join(qualifiers) + ")"
+        with sros_profile.phase("output"):
+            stopped = print_route_table(
+                svc_route_table,
+                page_size=options["page"],
+                title=title,
+                change_column=options["diff"],
+            )
+        if stopped:
+            break
 
 
 if __name__ == "__main__":